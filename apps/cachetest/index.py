@@ -2,7 +2,8 @@
 import time
 from zoom import *
 from zoom.mvc import *
-from zoom.cache import cached, clear_cache, Entry
+from zoom.cache import cached, clear_cache
+from zoom.middleware import cache_response
 
 
 actions = [
@@ -20,7 +21,8 @@ A toy app to demonstrate the caching mechanism.
 This is some content\n
 * [go to cached content](cachetest/cached-page)\n
 * [go to cached content with 3 second expire](cachetest/cached-page-with-expire)\n
-* [go to parameterized cached content](cachetest/cached-page-with-params)
+* [go to parameterized cached content](cachetest/cached-page-with-params)\n
+* [go to cached response](cachetest/cached-response)
 """)
         return page(content, title='Cache Tester', actions=actions)
 
@@ -54,7 +56,7 @@ This is some content\n
             message('cached page')
         return result
 
-    @cached('test', user.username, expire=3)
+    @cached('test', user.username, expire=3, tags=['users', user.username])
     def cached_page_content_with_params(self, first_name='', last_name=''):
         time.sleep(4)
         return markdown('Hello %s %s\n\nit usually takes a long time to generate this content\n\n' % (first_name, last_name))
@@ -69,15 +71,32 @@ This is some content\n
             message('cached page')
         return result
 
+    def cached_response(self):
+        cache_response(10)
+        time.sleep(4)
+        content = markdown(
+            'generated for %s at %s\n\n'
+            'each signed in user gets a response cached for them alone, '
+            'guests share one' % (user.username, time.ctime())
+        )
+        return page(content, title='Cached Response', actions=actions)
+
     def clear(self):
         clear_cache('cached_page_content')
         message('cleared cache')
         return home()
 
     def list(self):
-        entries = store(Entry)
+        cmd = """
+            select method, from_unixtime(expiry), length(value)
+            from dz_cache
+            where app=%s
+            order by expiry
+        """
+        entries = list(system.db(cmd, system.app.name))
         if entries:
-            return page(browse(store(Entry)), actions=actions, title='Cache Contents')
+            labels = 'Method', 'Expires', 'Size'
+            return page(browse(entries, labels=labels), actions=actions, title='Cache Contents')
         else:
             return page('cache is empty', title='No Cache', actions=actions)
 
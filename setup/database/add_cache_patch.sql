@@ -0,0 +1,25 @@
+--
+-- Table structure for table `dz_cache`
+--
+create table dz_cache (
+    id        char(40) NOT NULL,
+    app       varchar(100) NOT NULL,
+    method    varchar(100) NOT NULL,
+    scope     char(40) NOT NULL,
+    stale     double NOT NULL,
+    expiry    double NOT NULL,
+    value     mediumblob,
+    PRIMARY KEY (id),
+    KEY `expiry_key` (`expiry`),
+    KEY `scope_key` (`app`, `method`, `scope`)
+    ) ENGINE=MyISAM DEFAULT CHARSET=utf8;
+
+--
+-- Table structure for table `dz_cache_tags`
+--
+create table dz_cache_tags (
+    tag       varchar(100) NOT NULL,
+    id        char(40) NOT NULL,
+    PRIMARY KEY (tag, id),
+    KEY `id_key` (`id`)
+    ) ENGINE=MyISAM DEFAULT CHARSET=utf8;
@@ -0,0 +1,16 @@
+--
+-- Table structure for table `entity_indexes`
+--
+create table entity_indexes (
+    kind      varchar(100) NOT NULL,
+    attribute varchar(100) NOT NULL,
+    datatype  varchar(30),
+    value     mediumblob,
+    row_id    int not null,
+    num_value  double,
+    date_value datetime,
+    KEY `row_id_key` (`row_id`),
+    KEY `kv` (`kind`, `attribute`, `value`(100)),
+    KEY `kn` (`kind`, `attribute`, `num_value`),
+    KEY `kd` (`kind`, `attribute`, `date_value`)
+    ) ENGINE=MyISAM DEFAULT CHARSET=latin1;
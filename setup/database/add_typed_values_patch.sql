@@ -0,0 +1,18 @@
+--
+-- Typed value columns for table `attributes`
+--
+-- Optional.  Numeric and date values are copied into columns of their own
+-- so range searches on them can use an index.  The entity store detects
+-- the columns and keeps them up to date once they exist.
+--
+-- App servers cache whether the columns exist for up to five minutes, and
+-- until they notice them they keep writing rows without typed values.  So
+-- after running this patch restart every app server, or wait five
+-- minutes, and only then run fill_typed_values_patch.sql to fill in the
+-- rows written before.
+--
+alter table attributes
+    add column num_value  double,
+    add column date_value datetime,
+    add KEY `kn` (`kind`, `attribute`, `num_value`),
+    add KEY `kd` (`kind`, `attribute`, `date_value`);
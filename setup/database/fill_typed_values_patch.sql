@@ -0,0 +1,14 @@
+--
+-- Fill the typed value columns of table `attributes`
+--
+-- Run after add_typed_values_patch.sql once every app server has been
+-- restarted (see there).  Recomputes the typed values of every row, so it
+-- is safe to run again to repair rows written by a server that had not
+-- yet noticed the columns.
+--
+update attributes set num_value=value+0
+    where datatype in ('int', 'long', 'float', 'decimal.Decimal')
+    and value not in ('inf', '-inf', 'nan');
+
+update attributes set date_value=value
+    where datatype in ('datetime.date', 'datetime.datetime');
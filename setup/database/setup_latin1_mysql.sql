@@ -107,6 +107,52 @@ create table if not exists attributes (
     KEY `kv` (`kind`, `attribute`, `value`(100))
     ) ENGINE=MyISAM DEFAULT CHARSET=latin1;
 
+--
+-- Table structure for table `entity_indexes`
+--
+drop table if exists entity_indexes;
+create table if not exists entity_indexes (
+    kind      varchar(100) NOT NULL,
+    attribute varchar(100) NOT NULL,
+    datatype  varchar(30),
+    value     mediumblob,
+    row_id    int not null,
+    num_value  double,
+    date_value datetime,
+    KEY `row_id_key` (`row_id`),
+    KEY `kv` (`kind`, `attribute`, `value`(100)),
+    KEY `kn` (`kind`, `attribute`, `num_value`),
+    KEY `kd` (`kind`, `attribute`, `date_value`)
+    ) ENGINE=MyISAM DEFAULT CHARSET=latin1;
+
+--
+-- Table structure for table `dz_cache`
+--
+drop table if exists dz_cache;
+create table if not exists dz_cache (
+    id        char(40) NOT NULL,
+    app       varchar(100) NOT NULL,
+    method    varchar(100) NOT NULL,
+    scope     char(40) NOT NULL,
+    stale     double NOT NULL,
+    expiry    double NOT NULL,
+    value     mediumblob,
+    PRIMARY KEY (id),
+    KEY `expiry_key` (`expiry`),
+    KEY `scope_key` (`app`, `method`, `scope`)
+    ) ENGINE=MyISAM DEFAULT CHARSET=latin1;
+
+--
+-- Table structure for table `dz_cache_tags`
+--
+drop table if exists dz_cache_tags;
+create table if not exists dz_cache_tags (
+    tag       varchar(100) NOT NULL,
+    id        char(40) NOT NULL,
+    PRIMARY KEY (tag, id),
+    KEY `id_key` (`id`)
+    ) ENGINE=MyISAM DEFAULT CHARSET=latin1;
+
 --
 -- Table structure for table `dz_groups`
 --
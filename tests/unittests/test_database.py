@@ -254,3 +254,17 @@ class TestDatabase(unittest.TestCase):
         self.assert_(rec.ID==2 and rec.NAME=='Alex' and rec.AMOUNT==Decimal('100.24'))
         db('drop table dzdb_test_table')
 
+
+    def test_shared_database(self):
+        from zoom.db import database as new_db
+        db = new_db('mysql', host='database', user='testuser', passwd='password', db='test')
+        legacy = shared_database(db)
+        self.assertEquals(legacy.thread_id(), db.thread_id())
+        legacy('drop table if exists dzdb_test_table')
+        legacy('create table dzdb_test_table (ID CHAR(10),NOTES TEXT)')
+        db('insert into dzdb_test_table values ("1234","Hello there")')
+        self.assertEquals(legacy('select * from dzdb_test_table')[0][1],'Hello there')
+        legacy.close()
+        self.assertEquals(list(db('select count(*) from dzdb_test_table')),[(1,)])
+        db('drop table dzdb_test_table')
+        db.close()
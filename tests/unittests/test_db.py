@@ -17,7 +17,8 @@ from decimal import Decimal
 from datetime import date, datetime
 
 from zoom.utils import trim
-from zoom.db import database
+from zoom.db import database, connection_pool, Database
+from zoom.records import schema_cache
 
 
 class TestDb(unittest.TestCase):
@@ -63,6 +64,31 @@ class TestDb(unittest.TestCase):
         #     self.assertEqual(rec, ("1234", 50, "2005-01-14", "Hello there"))
         #     break
 
+    def test_Result_compact(self):
+        db = self.db
+        db("""drop table if exists dzdb_test_table""")
+        db("""create table dzdb_test_table (ID CHAR(10), AMOUNT
+           NUMERIC(10,2),DTADD DATE,NOTES TEXT)""")
+        db("""insert into dzdb_test_table values
+           ("1234",50,"2005-01-14","Hello there")""")
+        rows = list(db('select * from dzdb_test_table').compact())
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].AMOUNT, Decimal('50.00'))
+        self.assertEqual(rows[0]['NOTES'], 'Hello there')
+        self.assertEqual(rows[0][0], '1234')
+        db("""drop table dzdb_test_table""")
+
+    def test_Result_compact_columns_named_like_tuple_methods(self):
+        db = self.db
+        db("""drop table if exists dzdb_test_table""")
+        db("""create table dzdb_test_table (`index` INT, `count` INT)""")
+        db("""insert into dzdb_test_table values (1, 20)""")
+        row = list(db('select * from dzdb_test_table').compact())[0]
+        self.assertEqual((row.index, row.count), (1, 20))
+        self.assertEqual(row['count'], 20)
+        self.assertEqual(row[1], 20)
+        db("""drop table dzdb_test_table""")
+
     def test_Result_of_queries(self):
         db = self.db
         db("""drop table if exists dzdb_test_table""")
@@ -206,3 +232,56 @@ class TestDb(unittest.TestCase):
         for row in t:
             self.assertEqual(row[-1], Decimal("24.10"))
         db('drop table dzdb_test_table')
+
+    def test_pooled_connections(self):
+        params = dict(
+            host='database',
+            user='testuser',
+            passwd='password',
+            db='test',
+            pool_size=2,
+        )
+        db = database('mysql', **params)
+        connection_id = db.thread_id()
+        db.close()
+
+        db = database('mysql', **params)
+        self.assertEqual(db.thread_id(), connection_id)
+        self.assertEqual(list(db('select 1')), [(1,)])
+        db.close()
+
+    def test_pool_replaces_stale_connections(self):
+        import MySQLdb
+        pool = connection_pool(
+            MySQLdb.connect,
+            1,
+            host='database',
+            user='testuser',
+            passwd='password',
+            db='test',
+        )
+        pool.ping_interval = 0
+        connection = pool()
+        connection.close()
+        pool.release(connection)
+        connection = pool()
+        self.assertTrue(pool.alive(connection))
+        pool.release(connection)
+        pool.close()
+        self.assertEqual(len(pool), 0)
+
+    def test_identity_with_unhashable_keywords(self):
+        import MySQLdb
+        from MySQLdb.converters import conversions
+        params = dict(
+            host='database',
+            user='testuser',
+            passwd='password',
+            db='test',
+        )
+        a, b = [
+            Database(MySQLdb.connect, conv=conversions.copy(), **params)
+            for _ in range(2)
+        ]
+        self.assertEqual(hash(a.identity), hash(b.identity))
+        self.assertTrue(schema_cache(a) is schema_cache(b))
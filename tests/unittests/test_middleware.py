@@ -0,0 +1,147 @@
+"""
+    Test the middleware module
+
+    Copyright (c) 2005-2016 Dynamic Solutions Inc.
+    support@dynamic-solutions.com
+
+    This file is part of DataZoomer.
+"""
+
+import unittest
+
+from zoom.request import Request
+from zoom.system import system
+from zoom.user import user
+from zoom.utils import Record
+from zoom import middleware
+from zoom.middleware import cache_responses
+
+
+class TestCacheResponses(unittest.TestCase):
+    """test the response cache handler"""
+
+    # pylint: disable=missing-docstring
+
+    def setUp(self):
+        middleware.responses.clear()
+        middleware.variants.clear()
+        self.calls = 0
+
+    def tearDown(self):
+        system.session = None
+        user.__dict__.pop('is_authenticated', None)
+        user.__dict__.pop('user_id', None)
+        user.username = None
+
+    def request(self, path='/content/about', method='GET', **env):
+        env.update(PATH_INFO=path, REQUEST_METHOD=method, HTTP_HOST='site')
+        return Request(env)
+
+    def session(self, token):
+        return dict(HTTP_COOKIE='dz4sid=%s' % token)
+
+    def user_app(self, user_id, username):
+        def app(request):
+            user.is_authenticated = True
+            user.user_id, user.username = user_id, username
+            request.cache_response = 60
+            return '200 OK', [], 'hello %s' % user.username
+        return app
+
+    def app(self, request, cache_for=60):
+        self.calls += 1
+        if cache_for:
+            request.cache_response = cache_for
+        headers = [
+            ('Content-type', 'text/html'),
+            ('Cache-Control', 'no-cache'),
+            ('Set-Cookie', 'session=abc'),
+        ]
+        return '200 OK', headers, 'page %s' % self.calls
+
+    def test_opted_in_response_is_cached(self):
+        status, headers, content = cache_responses(self.request(), self.app)
+        self.assertEqual(content, 'page 1')
+        self.assertIn(('Set-Cookie', 'session=abc'), headers)
+        self.assertEqual(dict(headers)['Cache-Control'], 'private, max-age=60')
+
+        status, headers, content = cache_responses(self.request(), self.app)
+        self.assertEqual(content, 'page 1')
+        self.assertEqual(self.calls, 1)
+        self.assertNotIn('Set-Cookie', dict(headers))
+        self.assertIn('ETag', dict(headers))
+        self.assertIn('Last-Modified', dict(headers))
+
+    def test_routes_not_opted_in_are_not_cached(self):
+        app = lambda request: self.app(request, cache_for=None)
+        cache_responses(self.request(), app)
+        status, headers, content = cache_responses(self.request(), app)
+        self.assertEqual(content, 'page 2')
+        self.assertEqual(dict(headers)['Cache-Control'], 'no-cache')
+
+    def test_query_is_part_of_the_key(self):
+        cache_responses(self.request(QUERY_STRING='a=1'), self.app)
+        _, _, content = cache_responses(
+            self.request(QUERY_STRING='a=2'), self.app
+        )
+        self.assertEqual(content, 'page 2')
+
+    def test_post_is_not_cached(self):
+        cache_responses(self.request(), self.app)
+        _, _, content = cache_responses(self.request(method='POST'), self.app)
+        self.assertEqual(content, 'page 2')
+
+    def test_other_requests_forget_the_variant(self):
+        cache_responses(self.request(), self.app)
+        cache_responses(self.request('/logout'), lambda r: self.app(r, 0))
+        _, _, content = cache_responses(self.request(), self.app)
+        self.assertEqual(content, 'page 3')
+
+    def test_conditional_requests(self):
+        _, headers, _ = cache_responses(self.request(), self.app)
+        etag = dict(headers)['ETag']
+        modified = dict(headers)['Last-Modified']
+
+        status, headers, content = cache_responses(
+            self.request(HTTP_IF_NONE_MATCH=etag), self.app
+        )
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(content, '')
+        self.assertEqual(dict(headers)['ETag'], etag)
+
+        status, _, _ = cache_responses(
+            self.request(HTTP_IF_MODIFIED_SINCE=modified), self.app
+        )
+        self.assertEqual(status, '304 Not Modified')
+
+        status, _, content = cache_responses(
+            self.request(HTTP_IF_NONE_MATCH='"other"'), self.app
+        )
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(content, 'page 1')
+
+    def test_users_do_not_share_responses(self):
+        joe, sam = self.session('joe'), self.session('sam')
+        cache_responses(self.request(**joe), self.user_app(1, 'joe'))
+        cache_responses(self.request(**sam), self.user_app(2, 'sam'))
+        _, _, content = cache_responses(
+            self.request(**joe), self.user_app(1, 'joe')
+        )
+        self.assertEqual(content, 'hello joe')
+        _, _, content = cache_responses(
+            self.request(**sam), self.user_app(2, 'sam')
+        )
+        self.assertEqual(content, 'hello sam')
+
+    def test_responses_with_the_csrf_token_are_not_cached(self):
+        system.session = Record(csrf_token='f00d')
+        form = lambda request: self.app(request)[:2] + ('<form>f00d',)
+        cache_responses(self.request(), form)
+        _, _, content = cache_responses(self.request(), self.app)
+        self.assertEqual(content, 'page 2')
+
+    def test_posts_forget_the_variant(self):
+        cache_responses(self.request(), self.app)
+        cache_responses(self.request(method='POST'), self.app)
+        _, _, content = cache_responses(self.request(), self.app)
+        self.assertEqual(content, 'page 3')
@@ -172,6 +172,74 @@ class TestRecordStore(unittest.TestCase):
         self.people.zap()
         self.assertEqual(0, len(self.people))
 
+    def test_stream(self):
+        names = [person.name for person in self.people.stream(2)]
+        self.assertEqual(names, ['Joe', 'Sam', 'Ann'])
+        names = [person.name for person in self.people.stream(3)]
+        self.assertEqual(names, ['Joe', 'Sam', 'Ann'])
+
+    def test_stream_compact(self):
+        people = list(self.people.stream(2, compact=True))
+        self.assertEqual([p.name for p in people], ['Joe', 'Sam', 'Ann'])
+        self.assertEqual(people[1]['age'], 25)
+        self.assertEqual(people[1][self.id_name], self.sam_id)
+
+    def test_put_many(self):
+        sam = self.people.get(self.sam_id)
+        sam.age = 26
+        ids = self.people.put_many([
+            sam,
+            Person(name='Jane', age=20),
+            Person(name='Jim'),
+            Person(name='Jill', age=40),
+        ])
+        self.assertEqual(ids[0], self.sam_id)
+        self.assertTrue(ids[1] < ids[2] < ids[3])
+        self.assertEqual(self.people.get(ids[3]).name, 'Jill')
+        self.assertEqual(self.people.get(self.sam_id).age, 26)
+        self.assertEqual(self.people.get(ids[1]).name, 'Jane')
+        self.assertEqual(self.people.get(ids[2]).name, 'Jim')
+        self.assertEqual(len(self.people), 6)
+
+    def test_filter(self):
+        from zoom.expressions import gt
+        names = [p.name for p in self.people.filter(age=gt(28))]
+        self.assertEqual(sorted(names), ['Ann', 'Joe'])
+        names = [p.name for p in self.people.filter(
+            lambda p: p.name.startswith('J'), age=gt(28))]
+        self.assertEqual(names, ['Joe'])
+
+    def test_search(self):
+        self.assertEqual([p.name for p in self.people.search('jo')], ['Joe'])
+        self.assertEqual([p.name for p in self.people.search('a 30')], ['Ann'])
+        self.assertEqual(list(self.people.search('zed')), [])
+
+    def test_search_special_characters(self):
+        self.people.put(Person(name=r'C:\temp', age=1))
+        self.people.put(Person(name='50% off', age=2))
+        self.people.put(Person(name='500 off', age=3))
+        self.assertEqual(
+            [p.name for p in self.people.search(r'c:\temp')], [r'C:\temp']
+        )
+        self.assertEqual(
+            [p.name for p in self.people.search('50%')], ['50% off']
+        )
+
+    def test_slices(self):
+        people = self.people
+        self.assertEqual(people[0].name, 'Joe')
+        self.assertEqual(people[-1].name, 'Ann')
+        self.assertEqual([p.name for p in people[1:]], ['Sam', 'Ann'])
+        self.assertEqual([p.name for p in people[:-1]], ['Joe', 'Sam'])
+        self.assertEqual([p.name for p in people[::-1]], ['Ann', 'Sam', 'Joe'])
+        self.assertRaises(IndexError, lambda: people[3])
+
+    def test_page(self):
+        page = self.people.page(size=2)
+        self.assertEqual([p.name for p in page], ['Joe', 'Sam'])
+        page = self.people.page(after=page[-1][self.id_name], size=2)
+        self.assertEqual([p.name for p in page], ['Ann'])
+
 
 class TestKeyedRecordStore(TestRecordStore):
     """Keyed RecordStore Tests
@@ -6,6 +6,7 @@
 
 from zoom.store import Entity, EntityStore
 from zoom.db import Database
+from zoom.database import shared_database
 
 import MySQLdb
 
@@ -116,3 +117,265 @@ class TestStore(unittest.TestCase):
         self.assertEqual(3, len(self.people))
         self.people.zap()
         self.assertEqual(0, len(self.people))
+
+    def test_find_multiple_criteria(self):
+        self.people.put(Person(name='Sam', age=30))
+        people = self.people.find(name='Sam', age=25)
+        self.assertEqual([p._id for p in people], [self.sam_id])
+        people = self.people.find(name=['Sam', 'Joe'], age=[25, 50])
+        self.assertEqual(
+            sorted(p._id for p in people),
+            sorted([self.sam_id, self.joe_id])
+        )
+        self.assertEqual(self.people.find(name='Sam', age=99), [])
+        self.assertEqual(self.people.find(name=[]), [])
+
+    def test_find_search_terms(self):
+        from zoom.expressions import gt, gte, lt, ne, occurs
+        people = self.people
+        ann_id = people.first(name='Ann')._id
+        people.put(Person(name='Al', age='100'))
+        self.assertEqual([p._id for p in people.find(age=gt(40))],
+                         [self.joe_id])
+        self.assertEqual(
+            sorted(p._id for p in people.find(age=gte(30))),
+            sorted([self.joe_id, ann_id])
+        )
+        self.assertEqual([p._id for p in people.find(age=lt(30), name=ne('Joe'))],
+                         [self.sam_id])
+        self.assertEqual(len(people.find(name=occurs(['Joe', 'Ann']))), 2)
+        self.assertEqual(people.last(age=lt(40))._id, ann_id)
+        people.delete(age=gt(40))
+        self.assertEqual(people.get(self.joe_id), None)
+
+    def test_find_date_range(self):
+        from zoom.expressions import gt, lte
+        people = self.people
+        al_id = people.put(Person(name='Al', born=date(1990, 5, 1)))
+        bo_id = people.put(Person(name='Bo', born=datetime(2001, 1, 1, 8)))
+        self.assertEqual([p._id for p in people.find(born=gt(date(2000, 1, 1)))],
+                         [bo_id])
+        self.assertEqual([p._id for p in people.find(born=lte(date(2000, 1, 1)))],
+                         [al_id])
+
+    def test_slices(self):
+        people = self.people
+        ann_id = people.first(name='Ann')._id
+        self.assertEqual(people[0]._id, self.joe_id)
+        self.assertEqual(people[-1]._id, ann_id)
+        self.assertEqual([p._id for p in people[1:]], [self.sam_id, ann_id])
+        self.assertEqual([p._id for p in people[::-2]], [ann_id, self.joe_id])
+        self.assertEqual(people[2:1], [])
+        self.assertRaises(IndexError, lambda: people[3])
+        self.assertRaises(IndexError, lambda: people[-4])
+
+    def test_page(self):
+        people = self.people
+        page = people.page(size=2)
+        self.assertEqual([p._id for p in page], [self.joe_id, self.sam_id])
+        page = people.page(after=page[-1]._id, size=2)
+        self.assertEqual([p.name for p in page], ['Ann'])
+        self.assertEqual(people.page(after=page[-1]._id, size=2), [])
+
+    def test_put_many(self):
+        people = self.people
+        sam = people.get(self.sam_id)
+        sam.age = 26
+        batch = [sam] + [Person(name='Kid %s' % n, age=n) for n in range(5)]
+        ids = people.put_many(batch, chunk_size=2)
+        self.assertEqual(ids[0], self.sam_id)
+        self.assertEqual(len(set(ids)), 6)
+        self.assertEqual(len(people), 8)
+        self.assertEqual(people.get(self.sam_id).age, 26)
+        self.assertEqual(dict(people.get(ids[3])),
+                         dict(_id=ids[3], name='Kid 2', age=2))
+        self.assertEqual(people.put_many([]), [])
+
+    def test_put_updates_changed_attributes_only(self):
+        def attribute_rows():
+            cmd = 'select attribute, id from attributes where row_id=%s'
+            return dict(self.db(cmd, self.sam_id))
+        sam = self.people.get(self.sam_id)
+        before = attribute_rows()
+        self.people.put(sam)
+        self.assertEqual(attribute_rows(), before)
+        sam.age = 26
+        sam.kids = 2
+        self.people.put(sam)
+        after = attribute_rows()
+        self.assertEqual(after['name'], before['name'])
+        self.assertEqual(after['age'], before['age'])
+        self.assertEqual(sorted(after), ['age', 'kids', 'name'])
+        del sam['kids']
+        self.people.put(sam)
+        self.assertEqual(sorted(attribute_rows()), ['age', 'name'])
+        self.assertEqual(dict(self.people.get(self.sam_id)),
+                         dict(_id=self.sam_id, name='Sam', age=26))
+
+    def test_stream(self):
+        names = [person.name for person in self.people.stream(2)]
+        self.assertEqual(names, ['Joe', 'Sam', 'Ann'])
+        self.assertEqual([person.name for person in self.people], names)
+
+    def test_attribute_projection(self):
+        joe = self.people.get(self.joe_id, attributes=['name'])
+        self.assertEqual(joe.name, 'Joe')
+        self.assertFalse('age' in joe)
+        self.assertEqual(joe._id, self.joe_id)
+        names = sorted(p.name for p in self.people.all(attributes=['name']))
+        self.assertEqual(names, ['Ann', 'Joe', 'Sam'])
+        found = self.people.find(name='Sam', attributes=['age'])
+        self.assertEqual(
+            [dict(p) for p in found], [dict(_id=self.sam_id, age=25)]
+        )
+        ann = self.people.first(age=30, attributes=['name'])
+        self.assertEqual(sorted(ann.keys()), ['_id', 'name'])
+
+    def test_key_only_projection(self):
+        joe = self.people.get(self.joe_id, attributes=['_id'])
+        self.assertEqual(dict(joe), dict(_id=self.joe_id))
+        self.assertEqual(self.people.get(self.joe_id + 100, ['_id']), None)
+        found = self.people.find(name='Sam', attributes=['_id'])
+        self.assertEqual([dict(p) for p in found], [dict(_id=self.sam_id)])
+        keys = sorted(p._id for p in self.people.all(attributes=['_id']))
+        self.assertEqual(len(keys), 3)
+        self.assertTrue(self.joe_id in keys and self.sam_id in keys)
+
+    def test_find_ordered(self):
+        from zoom.expressions import gt
+        people = self.people.find(age=gt(20), order_by='age')
+        self.assertEqual([p.name for p in people], ['Sam', 'Ann', 'Joe'])
+        people = self.people.find(
+            age=gt(20), order_by='name', descending=True, limit=2
+        )
+        self.assertEqual([p.name for p in people], ['Sam', 'Joe'])
+        people = self.people.all(order_by='name', limit=1, offset=1)
+        self.assertEqual([p.name for p in people], ['Joe'])
+
+    def test_aggregate(self):
+        self.people.put(Person(name='Joe', age=20))
+        totals = self.people.aggregate('name', count=True, sum='age')
+        self.assertEqual(
+            [(r.name, r.count, r.age) for r in totals],
+            [('Ann', 1, 30), ('Joe', 2, 70), ('Sam', 1, 25)]
+        )
+        totals = self.people.aggregate(count=True, sum='age', name='Joe')
+        self.assertEqual([(r.count, r.age) for r in totals], [(2, 70)])
+
+    def test_aggregate_decimals(self):
+        self.people.put(Person(name='Joe', balance=Decimal('0.10')))
+        self.people.put(Person(name='Joe', balance=Decimal('0.20')))
+        self.people.put(Person(name='Joe', balance=1))
+        totals = self.people.aggregate(sum='balance', name='Joe')
+        self.assertEqual([r.balance for r in totals], [Decimal('1.30')])
+        self.assertEqual(type(totals[0].balance), Decimal)
+
+    def test_aggregate_legacy_database(self):
+        legacy = shared_database(self.db)
+        people = EntityStore(legacy, Person)
+        totals = people.aggregate('name', count=True, sum='age')
+        self.assertEqual(
+            [(r.name, r.count, r.age) for r in totals],
+            [('Ann', 1, 30), ('Joe', 1, 50), ('Sam', 1, 25)]
+        )
+
+    def test_typed_values(self):
+        from zoom.expressions import gt, lt
+        from zoom.records import invalidate_columns
+        self.db(
+            'alter table attributes '
+            'add column num_value double, add column date_value datetime'
+        )
+        invalidate_columns(self.db, 'attributes')
+        try:
+            self.db(
+                'update attributes set num_value=value+0 where datatype in '
+                "('int', 'long', 'float', 'decimal.Decimal')"
+            )
+            people = EntityStore(self.db, Person)
+            self.assertTrue(people._has_typed_values())
+
+            cmd = (
+                'select num_value, date_value from attributes '
+                'where row_id=%s and attribute=%s'
+            )
+            kim = Person(name='Kim', age=40, born=date(1990, 5, 5))
+            kim_id = people.put(kim)
+            self.assertEqual(list(self.db(cmd, kim_id, 'age')), [(40.0, None)])
+            self.assertEqual(
+                list(self.db(cmd, kim_id, 'born')),
+                [(None, datetime(1990, 5, 5))]
+            )
+
+            kim = people.get(kim_id)
+            kim.age = 20
+            people.put(kim)
+            self.assertEqual(list(self.db(cmd, kim_id, 'age')), [(20.0, None)])
+
+            self.assertEqual(
+                sorted(p.name for p in people.find(age=lt(28))), ['Kim', 'Sam']
+            )
+            self.assertEqual(
+                [p.name for p in people.find(born=gt(date(1990, 1, 1)))],
+                ['Kim']
+            )
+        finally:
+            self.db(
+                'alter table attributes '
+                'drop column num_value, drop column date_value'
+            )
+            invalidate_columns(self.db, 'attributes')
+
+    def test_indexes(self):
+        class IndexedPeople(EntityStore):
+            indexes = ['name']
+        people = IndexedPeople(self.db, Person)
+        people.reindex()
+        self.assertEqual(people.first(name='Sam')._id, self.sam_id)
+        sam = people.get(self.sam_id)
+        sam.name = 'Samuel'
+        people.put(sam)
+        self.assertEqual(people.first(name='Sam'), None)
+        self.assertEqual(people.first(name='Samuel')._id, self.sam_id)
+        jim_id = people.put(Person(name='Jim', age=40))
+        self.assertEqual(people.find(name='Jim', age=40)[0]._id, jim_id)
+        people.delete(jim_id)
+        self.assertEqual(people.first(name='Jim'), None)
+
+    def test_indexed_range_search(self):
+        from zoom.expressions import gt, lt
+        class IndexedPeople(EntityStore):
+            indexes = ['age']
+        people = IndexedPeople(self.db, Person)
+        people.reindex()
+        self.assertEqual(
+            sorted(p.name for p in people.find(age=gt(28))), ['Ann', 'Joe']
+        )
+        ann = people.first(name='Ann')
+        ann.age = 20
+        people.put(ann)
+        self.assertEqual(
+            sorted(p.name for p in people.find(age=lt(28))), ['Ann', 'Sam']
+        )
+
+    def test_materialize(self):
+        self.db('drop table if exists materialized_person')
+        records = self.people.materialize('materialized_person')
+        try:
+            self.assertEqual(len(records), 3)
+            joe = records.get(self.joe_id)
+            self.assertEqual((joe.name, joe.age), ('Joe', 50))
+            self.assertEqual(records.first(name='Sam')._id, self.sam_id)
+        finally:
+            self.db('drop table materialized_person')
+
+    def test_materialize_mixed_int_and_decimal(self):
+        self.db('drop table if exists materialized_person')
+        self.people.put(Person(name='Ray', age=123456))
+        self.people.put(Person(name='Kim', age=Decimal('1.25')))
+        records = self.people.materialize('materialized_person')
+        try:
+            self.assertEqual(records.first(name='Ray').age, 123456)
+            self.assertEqual(records.first(name='Kim').age, Decimal('1.25'))
+        finally:
+            self.db('drop table materialized_person')
@@ -0,0 +1,110 @@
+"""
+    entify.py
+
+    micro-benchmark for decoding entity store query results
+
+    compares the converter table used by zoom.store.entify with the
+    if/elif chain it replaced on a synthetic result set
+
+    usage:
+        python entify.py [entities] [repeat]
+
+"""
+import sys
+import timeit
+import datetime
+import decimal
+
+import zoom.jsonz
+from zoom.store import entify, Entity
+
+
+def legacy_decode(datatype, value):
+    """the original if/elif decoder"""
+    if datatype == 'str':
+        pass
+    elif datatype == 'unicode' and isinstance(value, unicode):
+        pass
+    elif datatype == 'unicode':
+        value = value.decode('utf8')
+    elif datatype == "long":
+        value = long(value)
+    elif datatype == "int":
+        value = int(value)
+    elif datatype == 'float':
+        value = float(value)
+    elif datatype == 'decimal.Decimal':
+        value = decimal.Decimal(value)
+    elif datatype == "datetime.date":
+        y = int(value[:4])
+        m = int(value[5:7])
+        d = int(value[8:10])
+        value = datetime.date(y, m, d)
+    elif datatype == "datetime.datetime":
+        y = int(value[:4])
+        m = int(value[5:7])
+        d = int(value[8:10])
+        hr = int(value[11:13])
+        mn = int(value[14:16])
+        sc = int(value[17:19])
+        value = datetime.datetime(y, m, d, hr, mn, sc)
+    elif datatype == 'bool':
+        value = (value == '1' or value == 'True')
+    elif datatype == 'NoneType':
+        value = None
+    elif datatype in ['list', 'tuple']:
+        value = zoom.jsonz.loads(value)
+    else:
+        raise Exception('unsupported data type: ' + repr(datatype))
+    return value
+
+
+def legacy_entify(rs, klass):
+    """the original entify"""
+    entities = {}
+    for _, _, row_id, attribute, datatype, value in rs:
+        value = legacy_decode(datatype, value)
+        entities.setdefault(row_id, klass(_id=row_id))[attribute] = value
+    return entities.values()
+
+
+ATTRIBUTES = [
+    ('name', 'str', 'Joe'),
+    ('title', 'unicode', 'Manager'),
+    ('age', 'int', '50'),
+    ('salary', 'float', '51000.50'),
+    ('birthdate', 'datetime.date', '1966-01-20'),
+    ('updated', 'datetime.datetime', '2016-01-20 10:20:30'),
+    ('active', 'bool', '1'),
+    ('notes', 'NoneType', 'None'),
+]
+
+
+def result_set(count):
+    """returns rows shaped like a select from the attributes table"""
+    rows = []
+    n = 0
+    for row_id in xrange(1, count + 1):
+        for attribute, datatype, value in ATTRIBUTES:
+            n += 1
+            rows.append((n, 'person', row_id, attribute, datatype, value))
+    return rows
+
+
+def main(count=1000, repeat=5):
+    rows = result_set(count)
+    assert len(entify(rows, Entity)) == len(legacy_entify(rows, Entity))
+
+    legacy = min(timeit.repeat(
+        lambda: legacy_entify(rows, Entity), number=1, repeat=repeat))
+    current = min(timeit.repeat(
+        lambda: entify(rows, Entity), number=1, repeat=repeat))
+
+    print '%d entities, %d rows' % (count, len(rows))
+    print 'legacy:  %8.4fs' % legacy
+    print 'current: %8.4fs' % current
+    print 'speedup: %8.2fx' % (legacy / current)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
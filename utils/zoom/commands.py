@@ -17,6 +17,7 @@ __all__ = [
     'auto',
     'server',
     'publish',
+    'materialize',
 ]
 
 
@@ -89,6 +90,15 @@ def auto(options, command, name, *args):
             done = True
 
 
+def materialize(options, kind, table=None, instance=None):
+    """copy the entities of a kind into a table of their own"""
+    from zoom import system
+    from zoom.store import EntityStore
+    system.setup(instance)
+    records = EntityStore(system.db, kind).materialize(table)
+    print '{} {} entities copied to {}'.format(len(records), kind, records.kind)
+
+
 def publish(options, path, server='git@dsilabs.ca'):
     """publish a resource to a repository server"""
 
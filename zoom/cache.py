@@ -10,102 +10,607 @@ to functions and methods.  Handy for caching generated pages.
 Used as a decorator.
 """
 
+import os
+import imp
+import sys
+import math
 import time
+import base64
+import pickle
+import hashlib
+import threading
+import traceback
+from collections import OrderedDict
 
-from .store import store
-from .store import Entity
 from .system import system
 from .helpers import message
 
-__all__ = ['cached', 'clear_cache']
+__all__ = ['cached', 'clear_cache', 'invalidate_tags', 'sweep_cache']
 
 
 DEFAULT_CACHE_LIFE = 3600  # one hour expiry
+LOCAL_CACHE_ENTRIES = 500
+LOCAL_CACHE_BYTES = 16 * 1024 * 1024
+LOCAL_CACHE_LIFE = 5  # seconds another process's changes can go unseen
+LOCK_WAIT = 5  # seconds to wait for another caller to fill an entry
+LOCK_POLL = 0.05
+REFRESH_WAIT = 60  # seconds a queued refresh has before it is queued again
+REFRESH_TOPIC = 'service.cache.refresh_cache'
 debugging = False
 
 
-class CacheEntry(Entity):
-    pass
+def sizeof(value):
+    """approximate number of bytes held by a cached value
 
+        >>> sizeof('abc')
+        3
+        >>> sizeof(u'abc')
+        3
+        >>> sizeof(None) > 0
+        True
+        >>> sizeof(('200 OK', [('Content-type', 'text/html')], 'abc'))
+        30
+    """
+    if isinstance(value, basestring):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(item) for item in value)
+    return sys.getsizeof(value)
 
-Entry = CacheEntry
 
+class LocalCache(object):
+    """bounded, expiry aware, least recently used in-process cache
 
-def load(key):
-    entries = store(Entry)
-    entry = entries.first(key=key)
-    now = time.time()
-    result = entry and entry.expiry > now and entry.value
-    if debugging and result:
-        message('cache hit!')
-    return result
+    Sits in front of the database tier so repeated hits are served
+    without a round trip to the server.  Entries are dropped when they
+    expire and, least recently used first, when either the number of
+    entries or the total size of the values goes over its limit.
 
+        >>> cache = LocalCache(entries=2, size=10)
+        >>> cache.put('a', 'one', expiry=time.time() + 60)
+        >>> cache.put('b', 'two', expiry=time.time() + 60)
+        >>> cache.get('a')
+        'one'
+        >>> cache.put('c', 'three', expiry=time.time() + 60)
+        >>> cache.get('b') is None
+        True
+        >>> len(cache), cache.size
+        (2, 8)
+        >>> cache.put('d', 'too big to fit', expiry=time.time() + 60)
+        >>> cache.get('d') is None
+        True
+        >>> cache.put('e', 'old', expiry=time.time() - 1)
+        >>> cache.get('e') is None
+        True
+        >>> cache.delete('a')
+        >>> cache.get('a') is None
+        True
+        >>> cache.clear()
+        >>> len(cache), cache.size
+        (0, 0)
+    """
 
-def save(key, value, expire=DEFAULT_CACHE_LIFE):
-    entries = store(Entry)
-    now = time.time()
-    entry = entries.first(key=key)
-    if entry:
-        entry.update(value=value, expiry=now + expire)
+    def __init__(self, entries=LOCAL_CACHE_ENTRIES, size=LOCAL_CACHE_BYTES):
+        self.max_entries = entries
+        self.max_size = size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """returns the value for key or None if missing or expired"""
+        with self.lock:
+            item = self.entries.pop(key, None)
+            if item is None:
+                return None
+            value, expiry, size = item
+            if expiry <= time.time():
+                self.size -= size
+                return None
+            self.entries[key] = item
+            return value
+
+    def put(self, key, value, expiry):
+        """stores value until expiry, evicting old entries to make room"""
+        size = sizeof(value)
+        with self.lock:
+            item = self.entries.pop(key, None)
+            if item is not None:
+                self.size -= item[2]
+            if size > self.max_size:
+                return
+            self.entries[key] = (value, expiry, size)
+            self.size += size
+            while (len(self.entries) > self.max_entries or
+                   self.size > self.max_size):
+                _, item = self.entries.popitem(last=False)
+                self.size -= item[2]
+
+    def delete(self, key):
+        """removes key if present"""
+        with self.lock:
+            item = self.entries.pop(key, None)
+            if item is not None:
+                self.size -= item[2]
+
+    def clear(self):
+        """removes all entries"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+local = LocalCache()
+
+
+def local_key(key):
+    """returns the key a value is kept under in the local cache
+
+    One process serves many sites, so local copies are scoped by the
+    database of the current site just as the dz_cache rows are.
+
+        >>> import sqlite3
+        >>> from db import Database
+        >>> system.db = Database(sqlite3.connect, database='site_a')
+        >>> keep_local('k', 'from a', time.time() + 60)
+        >>> local.get(local_key('k'))
+        'from a'
+        >>> system.db = Database(sqlite3.connect, database='site_b')
+        >>> local.get(local_key('k')) is None
+        True
+        >>> local.clear()
+    """
+    return getattr(getattr(system, 'db', None), 'identity', None), key
+
+
+def keep_local(key, value, stale):
+    """keeps a copy of a value in the local cache
+
+    Other processes can't reach this copy when they clear or invalidate
+    entries, so it is only kept for LOCAL_CACHE_LIFE seconds at most.
+
+        >>> keep_local('k', 'v', time.time() + 3600)
+        >>> local.entries[local_key('k')][1] <= time.time() + LOCAL_CACHE_LIFE
+        True
+        >>> local.clear()
+    """
+    local.put(
+        local_key(key), value, min(stale, time.time() + LOCAL_CACHE_LIFE)
+    )
+
+
+def create_cache(db):
+    """create the cache table if it is missing"""
+    db("""
+        create table if not exists dz_cache (
+            id        char(40) not null,
+            app       varchar(100) not null,
+            method    varchar(100) not null,
+            scope     char(40) not null,
+            stale     double not null,
+            expiry    double not null,
+            value     mediumblob,
+            primary key (id),
+            key expiry_key (expiry),
+            key scope_key (app, method, scope)
+        )
+    """)
+    db("""
+        create table if not exists dz_cache_tags (
+            tag       varchar(100) not null,
+            id        char(40) not null,
+            primary key (tag, id),
+            key id_key (id)
+        )
+    """)
+
+
+def hash_key(key):
+    """returns the fixed width digest a cache key is stored under
+
+        >>> hash_key(repr(('testapp', 'get_value', ((), {}))))
+        '188d8e01c318ac22dac0ab53cc64e9629767c8a2'
+    """
+    return hashlib.sha1(key).hexdigest()
+
+
+def load(key):
+    result = local.get(local_key(key))
+    if result is not None:
         if debugging:
-            message('overwrote expired cache entry ' + repr(expire))
-    else:
-        entry = Entry(key=key, value=value, expiry=now + expire)
+            message('local cache hit!')
+        return result
+    cmd = 'select value, stale from dz_cache where id=%s and stale>%s'
+    row = system.db(cmd, hash_key(key), time.time()).first()
+    result = row and pickle.loads(row[0])
+    if result:
+        keep_local(key, result, row[1])
         if debugging:
-            message('new cache entry ' + repr(entry.expiry))
-    entries.put(entry)
+            message('cache hit!')
+    return result
+
+
+def load_stale(key, after=0):
+    """returns the value stored for key even if it is stale
+
+    Values kept past the time they go stale (see stale_for) can be
+    limited to those that have not yet expired by passing the current
+    time as after.
+    """
+    cmd = 'select value from dz_cache where id=%s and expiry>%s'
+    row = system.db(cmd, hash_key(key), after).first()
+    return row and pickle.loads(row[0])
+
+
+def save(key, value, expire=DEFAULT_CACHE_LIFE, method='', scope='',
+         stale_for=0, tags=()):
+    stale = time.time() + expire
+    row_id = hash_key(key)
+    cmd = """
+        replace into dz_cache (id, app, method, scope, stale, expiry, value)
+        values (%s, %s, %s, %s, %s, %s, %s)
+    """
+    system.db(
+        cmd,
+        row_id,
+        system.app.name,
+        method,
+        scope,
+        stale,
+        stale + stale_for,
+        pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+    )
+    if tags:
+        cmd = 'replace into dz_cache_tags (tag, id) values ' + ','.join(
+            ['(%s, %s)'] * len(tags)
+        )
+        system.db(cmd, *[v for tag in tags for v in (tag, row_id)])
+    if debugging:
+        message('new cache entry ' + repr(stale))
+    keep_local(key, value, stale)
     return value
 
 
+def claim_refresh(key):
+    """returns True if the caller is the one to refresh a stale entry
+
+    The entry is treated as fresh for another REFRESH_WAIT seconds so
+    other callers neither refresh it nor queue it again meanwhile.
+    """
+    now = time.time()
+    cmd = 'update dz_cache set stale=%s where id=%s and stale<=%s'
+    system.db(cmd, now + REFRESH_WAIT, hash_key(key), now)
+    return system.db.rowcount == 1
+
+
+class KeyLock(object):
+    """lets only one caller at a time compute the value for a key
+
+    Callers in this process queue up on a lock kept for the key and callers
+    in other processes on a database advisory lock of the same name.  Used
+    as a context manager which returns True for the caller that holds both
+    locks and False for a caller that gave up waiting for them.
+
+        >>> system.setup_test()
+        >>> with KeyLock('k') as leader:
+        ...     with KeyLock('k', wait=0) as follower:
+        ...         leader, follower
+        (True, False)
+        >>> KeyLock.locks
+        {}
+    """
+
+    locks = {}
+    guard = threading.Lock()
+
+    def __init__(self, key, wait=LOCK_WAIT):
+        self.key = key
+        self.name = 'zoom.cache.' + hash_key(key)
+        self.wait = wait
+        self.lock = None
+        self.held = False
+        self.db_held = False
+
+    def __enter__(self):
+        deadline = time.time() + self.wait
+        with self.guard:
+            lock, users = self.locks.get(self.key, (None, 0))
+            self.lock = lock or threading.Lock()
+            self.locks[self.key] = self.lock, users + 1
+        self.held = self.lock.acquire(False)
+        while not self.held and time.time() < deadline:
+            time.sleep(LOCK_POLL)
+            self.held = self.lock.acquire(False)
+        if self.held:
+            timeout = max(0, int(math.ceil(deadline - time.time())))
+            cmd = 'select get_lock(%s, %s)'
+            self.db_held = system.db(cmd, self.name, timeout).first()[0] == 1
+        return self.held and self.db_held
+
+    def __exit__(self, *exc):
+        if self.db_held:
+            system.db('select release_lock(%s)', self.name)
+        if self.held:
+            self.lock.release()
+        with self.guard:
+            lock, users = self.locks[self.key]
+            if users > 1:
+                self.locks[self.key] = lock, users - 1
+            else:
+                del self.locks[self.key]
+
+
+def fetch(key, compute, expire=DEFAULT_CACHE_LIFE, method='', scope='',
+          stale_for=0, tags=(), refresh=None):
+    """returns the cached value for key, computing it on a miss
+
+    Only one caller computes a missing value.  While it does, the others
+    are given the stale value if there is one, or otherwise wait up to
+    LOCK_WAIT seconds for the new value before computing it themselves.
+
+    If refresh is given, a stale value that has not yet expired is
+    returned straight away and refresh is called to have it recomputed
+    elsewhere.  A refresh that fails is logged rather than raised, and
+    the entry is claimed again once REFRESH_WAIT has passed.
+
+        >>> from utils import Record
+        >>> system.setup_test()
+        >>> create_cache(system.db)
+        >>> system.app = Record(name='testapp')
+        >>> _ = save('k', 'old', expire=-1, stale_for=60)
+        >>> def unavailable():
+        ...     raise IOError('queue unavailable')
+        >>> fetch('k', lambda: 'new', refresh=unavailable)
+        'old'
+    """
+    def compute_and_save():
+        return save(key, compute(), expire, method, scope, stale_for, tags)
+
+    value = load(key)
+    if value:
+        return value
+    if refresh is not None:
+        stale = load_stale(key, time.time())
+        if stale:
+            if claim_refresh(key):
+                try:
+                    refresh()
+                except Exception:
+                    from .log import logger
+                    logger.error(traceback.format_exc())
+            return stale
+    stale = load_stale(key)
+    with KeyLock(key, wait=0 if stale else LOCK_WAIT) as leader:
+        if leader:
+            return load(key) or compute_and_save()
+    return stale or load(key) or compute_and_save()
+
+
+refreshers = {}
+
+
+def refresher_key(func):
+    """returns the file and name a function is registered for refresh under
+
+    Apps load their modules under the same names, index for one, so the
+    file tells their functions apart.
+    """
+    return os.path.abspath(func.func_code.co_filename), func.__name__
+
+
+def queue_refresh(func, key, args, kwargs, **options):
+    """queue a cached call to be recomputed by refresh_cache"""
+    filename, name = refresher_key(func)
+    system.queues.topic(REFRESH_TOPIC).put(dict(
+        options,
+        app=system.app.name,
+        filename=filename,
+        module=func.__module__,
+        name=name,
+        key=key,
+        call=base64.b64encode(pickle.dumps((args, kwargs))),
+    ))
+
+
+def refresh_cache(job):
+    """recompute and save a value queued for background refresh
+
+    Run as a zoom.services job, for example from a service.py in the
+    jobs folder:
+
+        Service('cache').process(refresh_cache)
+
+    The module the cached function was defined in is loaded from the
+    job's file for every job, the same way the app itself loads it, so
+    the function and any pickled instances of the app's classes come from
+    that app even when other apps use the same module name.
+    """
+    from .manager import manager
+    if not manager.apps:
+        manager.setup()
+    system.app = manager.get_app(job['app'])
+    filename = job['filename']
+    save_dir = os.getcwd()
+    try:
+        os.chdir(os.path.dirname(filename))
+        imp.load_source(str(job['module']), filename)
+        args, kwargs = pickle.loads(base64.b64decode(job['call']))
+        value = refreshers[filename, job['name']](*args, **kwargs)
+    finally:
+        os.chdir(save_dir)
+    save(
+        str(job['key']),
+        value,
+        job['expire'],
+        job['method'],
+        job['scope'],
+        job['stale_for'],
+        job['tags'],
+    )
+
+
 def calc_key(method_name, *a):
     return repr((system.app.name, method_name, a))
 
 
-def clear_cache(method_name, *keys):
-    entries = store(Entry)
-    for entry in entries:
-        entries.delete(entry)
+def calc_scope(method_name, keys):
+    """returns the digest shared by entries cached with the same keys"""
+    return hash_key(calc_key(method_name, keys))
+
+
+def clear_cache(method_name=None, *keys):
+    """remove cached entries for the current app
+
+    With no arguments every entry for the app is removed.  Given a method
+    name only the entries for that method are removed and given keys as
+    well only the entries cached with those decorator keys are removed.
+    """
+    local.clear()
+    cmd = 'delete from dz_cache where app=%s'
+    args = [system.app.name]
+    if method_name is not None:
+        cmd += ' and method=%s'
+        args.append(method_name)
+        if keys:
+            cmd += ' and scope=%s'
+            args.append(calc_scope(method_name, keys))
+    system.db(cmd, *args)
+
+
+def invalidate_tags(*tags):
+    """remove cached entries tagged with any of the tags, in any app
+
+        >>> from utils import Record
+        >>> system.setup_test()
+        >>> create_cache(system.db)
+        >>> system.app = Record(name='testapp')
+        >>> _ = save('a', 1, tags=['users', 'joe'])
+        >>> _ = save('b', 2, tags=['users', 'sally'])
+        >>> _ = save('c', 3, tags=['groups'])
+        >>> invalidate_tags('joe')
+        >>> load('a'), load('b'), load('c')
+        (None, 2, 3)
+        >>> invalidate_tags('users', 'groups')
+        >>> load('b'), load('c')
+        (None, None)
+    """
+    if tags:
+        local.clear()
+        marks = ','.join(['%s'] * len(tags))
+        cmd = """
+            delete from dz_cache where id in (
+                select id from dz_cache_tags where tag in ({})
+            )
+        """.format(marks)
+        system.db(cmd, *tags)
+        cmd = 'delete from dz_cache_tags where tag in ({})'.format(marks)
+        system.db(cmd, *tags)
+
+
+def sweep_cache():
+    """delete expired entries
+
+    Meant to be run regularly as a background job, for example from a
+    service.py in the jobs folder:
+
+        Service('cache').every(datetime.timedelta(minutes=10), sweep_cache)
+
+    Returns the number of entries removed.
+    """
+    system.db('delete from dz_cache where expiry<%s', time.time())
+    count = system.db.rowcount
+    system.db("""
+        delete from dz_cache_tags
+        where id not in (select id from dz_cache)
+    """)
+    return count
 
 
 def cached(*keys, **kv):
     """
         decorator that caches method results
 
+        Options are expire, the number of seconds a value stays fresh,
+        stale_for, the number of seconds a value is kept after that, and
+        refresh.  With refresh='background' a stale value is returned
+        right away while refresh_cache recomputes it in the background.
+        Entries can be given a list of tags which invalidate_tags uses to
+        remove them.
+
         >>> from system import system
+        >>> from utils import Record
         >>> key = 'x','abc'
         >>> system.setup_test()
-        >>> system.app = Entity(name='testapp')
+        >>> create_cache(system.db)
+        >>> system.app = Record(name='testapp')
         >>> class foo(object):
         ...     def __init__(self, value):
         ...         self.value = value
         ...     @cached(key)
         ...     def get_value(self, param=''):
         ...         return self.value + param
-        >>> clear_cache(key)
+        >>> clear_cache('get_value')
         >>> a = foo('bar')
         >>> a.get_value()
         'bar'
         >>> a.value = 'bahr'
         >>> a.get_value()
         'bar'
+        >>> clear_cache('get_value', ('x', 'other'))
+        >>> a.get_value()
+        'bar'
         >>> clear_cache('get_value', key)
         >>> a.get_value()
         'bahr'
+        >>> a.value = 'baa'
+        >>> clear_cache()
+        >>> a.get_value()
+        'baa'
 
-    """
-    """
     """
     def cached_decorator(*args, **kwargs):
         func = keys[0]
-        full_key = calc_key(func.__name__, args[1:], kwargs)
-        return load(full_key) or save(full_key, func(*args, **kwargs))
+        name = func.__name__
+        return fetch(
+            calc_key(name, args[1:], kwargs),
+            lambda: func(*args, **kwargs),
+            method=name,
+            scope=calc_scope(name, ()),
+        )
 
     def cached_decorator_with_params(func):
+        expire = kv.get('expire', DEFAULT_CACHE_LIFE)
+        stale_for = kv.get('stale_for', 0)
+        tags = list(kv.get('tags', ()))
+        refresh = kv.get('refresh')
+        if refresh not in (None, 'background'):
+            raise ValueError('unsupported refresh {!r}'.format(refresh))
+        if refresh:
+            refreshers[refresher_key(func)] = func
+
         def wrapper(*args, **kwargs):
-            expire = kv.pop('expire', DEFAULT_CACHE_LIFE)
-            full_key = calc_key(func.__name__, keys, args[1:], kwargs)
-            return load(full_key) or \
-                save(full_key, func(*args, **kwargs), expire=expire)
+            name = func.__name__
+            full_key = calc_key(name, keys, args[1:], kwargs)
+            options = dict(
+                expire=expire,
+                method=name,
+                scope=calc_scope(name, keys),
+                stale_for=stale_for,
+                tags=tags,
+            )
+
+            def queue():
+                queue_refresh(func, full_key, args, kwargs, **options)
+
+            return fetch(
+                full_key,
+                lambda: func(*args, **kwargs),
+                refresh=queue if refresh else None,
+                **options
+            )
         return wrapper
 
     if len(keys) == 1 and callable(keys[0]):
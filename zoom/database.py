@@ -11,7 +11,7 @@
 
 """
 
-__all__ = ['Database', 'Table', 'Columns', 'Column', 'database']
+__all__ = ['Database', 'Table', 'Columns', 'Column', 'database', 'shared_database']
 
 import string
 import decimal
@@ -152,6 +152,21 @@ class Database(object):
             self.__connection = self.__factory(*self.__args, **self.__keywords)
         return getattr(self.__connection, name)
 
+    @property
+    def identity(self):
+        """identifies the database, the same for every Database using it"""
+        from zoom.db import database_identity
+        factory = self.__factory
+        if isinstance(factory, SharedConnection):
+            return factory.db.identity
+        args, keywords = self.__args, self.__keywords
+        if hasattr(factory, 'release'):
+            # a zoom.db connection pool
+            factory, args, keywords = (
+                factory.factory, factory.args, factory.keywords
+            )
+        return database_identity(factory, args, keywords)
+
     def query(self,sql,args=None):
         return Query(self,sql,args)
 
@@ -166,7 +181,11 @@ class Database(object):
 
     def close(self):
         if self.__connection:
-            self.__connection.close()
+            release = getattr(self.__factory, 'release', None)
+            if release:
+                release(self.__connection)
+            else:
+                self.__connection.close()
             self.__connection = None
 
     def report(self):
@@ -632,15 +651,45 @@ class Record(object):
     def __nonzero__(self):
         return 1
 
-def database(engine='mysql', host='localhost', name='zoomdata', user='root', password='', port=''):
-    """Create and return a connected database"""
+def database(engine='mysql', host='localhost', name='zoomdata', user='root', password='', port='', pool_size=0):
+    """Create and return a connected database
+
+    Passing a pool_size draws connections from the same process wide pool
+    used by zoom.db so they stay open between requests.
+    """
     if engine == 'mysql':
         import MySQLdb
         port = port and int(port) or 3306
+        if pool_size:
+            from zoom.db import connection_pool, MYSQL_RESET_COMMANDS
+            pool = connection_pool(MySQLdb.Connect, pool_size, host=host, user=user, passwd=password, db=name, port=port)
+            pool.autocommit = True
+            pool.reset_commands = MYSQL_RESET_COMMANDS
+            return Database(pool)
         db = Database(MySQLdb.Connect, host=host, user=user, passwd=password, db=name, port=port)
         db.autocommit(1)
         return db
 
+class SharedConnection(object):
+    """Connection factory that lends out the connection of a zoom.db
+    Database so both APIs run over one socket and one transaction context.
+    The connection belongs to the zoom.db Database so it is left open when
+    the legacy Database is closed."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __call__(self):
+        return self.db.connection
+
+    def release(self, connection):
+        pass
+
+def shared_database(db):
+    """Create a legacy database that shares the connection of a zoom.db
+    Database"""
+    return Database(SharedConnection(db))
+
 def test_database():
     """Create and return a connected testing database"""
     return database(name='test', user='testuser', password='password')
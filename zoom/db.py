@@ -2,13 +2,21 @@
     a database that does less
 """
 
+import threading
 import timeit
 
 from zoom.exceptions import DatabaseException
-from zoom.utils import ItemList
+from zoom.utils import ItemList, row_type
 
 
 ARRAY_SIZE = 1000
+DEFAULT_POOL_SIZE = 5
+PING_INTERVAL = 5  # seconds a connection can sit idle before being checked
+MYSQL_RESET_COMMANDS = ['do release_all_locks()']
+IDENTITY_KEYWORDS = (
+    'host', 'port', 'unix_socket', 'db', 'database', 'user',
+    'read_default_file',
+)
 
 ERROR_TPL = """
   statement: {!r}
@@ -17,6 +25,30 @@ ERROR_TPL = """
 """
 
 
+def database_identity(factory, args, keywords):
+    """returns a hashable identity for the database a connection reaches
+
+    Only the arguments that name the server, database and user count, so
+    connections made with their own copies of options such as conv
+    share an identity.
+
+        >>> import sqlite3
+        >>> a = database_identity(sqlite3.connect, ('a',), dict(conv={}))
+        >>> a == database_identity(sqlite3.connect, ('a',), dict(conv={}))
+        True
+        >>> a == database_identity(sqlite3.connect, ('b',), {})
+        False
+        >>> b = database_identity(object, (), dict(host='x', db='y'))
+        >>> b == database_identity(object, (), dict(host='x', db='z'))
+        False
+    """
+    return factory, repr(args), tuple(
+        (name, repr(keywords[name]))
+        for name in IDENTITY_KEYWORDS
+        if name in keywords
+    )
+
+
 class Result(object):
     """database query result"""
     # pylint: disable=too-few-public-methods
@@ -52,6 +84,184 @@ class Result(object):
         for i in self:
             return i
 
+    def compact(self):
+        """iterate over the result as compact read only rows
+
+        Rows share a single map of column names so they can be read by
+        name, as in row.name or row['name'], at about the memory cost of
+        plain tuples.
+        """
+        cls = row_type(d[0] for d in self.cursor.description)
+        for result in self:
+            yield cls(result)
+
+
+class ConnectionPool(object):
+    """
+    keeps database connections open between requests
+
+    A pool is callable so it can be handed to a Database object in place of
+    a connection factory.  Connections are checked out when called and
+    checked back in with release.  Connections that have been sitting idle
+    are pinged before being handed out and are replaced if they have gone
+    stale.  Connections are rolled back and put through the reset commands
+    when they are checked in, and are discarded if that fails, so no
+    transaction or lock outlives the request that started it.  Each reset
+    command is first tried on a new connection and skipped from then on if
+    the server does not support it.
+
+        >>> import sqlite3
+        >>> pool = ConnectionPool(sqlite3.connect, 2, database=':memory:')
+        >>> a, b, c = pool(), pool(), pool()
+        >>> pool.release(a)
+        >>> pool.release(b)
+        >>> pool.release(c)
+        >>> len(pool)
+        2
+        >>> pool() is b
+        True
+        >>> pool.close()
+        >>> len(pool)
+        0
+        >>> pool.reset_commands = ['select no_such_function()']
+        >>> pool.release(pool())
+        >>> len(pool), pool.unsupported
+        (1, set(['select no_such_function()']))
+        >>> connection = pool()
+        >>> connection.close()
+        >>> pool.release(connection)
+        >>> len(pool)
+        0
+    """
+
+    def __init__(self, factory, size=DEFAULT_POOL_SIZE, *args, **keywords):
+        self.factory = factory
+        self.size = size
+        self.args = args
+        self.keywords = keywords
+        self.autocommit = False
+        self.ping_interval = PING_INTERVAL
+        self.reset_commands = []
+        self.checked = set()
+        self.unsupported = set()
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """make a new connection"""
+        connection = self.factory(*self.args, **self.keywords)
+        if self.autocommit:
+            connection.autocommit(1)
+        self.check(connection)
+        return connection
+
+    def check(self, connection):
+        """tries reset commands not yet tried, noting any that fail"""
+        commands = [c for c in self.reset_commands if c not in self.checked]
+        if commands:
+            cursor = connection.cursor()
+            for command in commands:
+                try:
+                    cursor.execute(command)
+                except Exception:  # pylint: disable=broad-except
+                    self.unsupported.add(command)
+                self.checked.add(command)
+            cursor.close()
+            connection.rollback()
+
+    def alive(self, connection):
+        """returns True if the connection still works"""
+        ping = getattr(connection, 'ping', None)
+        if ping is None:
+            return True
+        try:
+            ping()
+        except Exception:  # pylint: disable=broad-except
+            return False
+        return True
+
+    def reset(self, connection):
+        """returns True if the connection was put back in a clean state"""
+        try:
+            connection.rollback()
+            if self.autocommit:
+                connection.autocommit(1)
+            commands = [
+                c for c in self.reset_commands if c not in self.unsupported
+            ]
+            if commands:
+                cursor = connection.cursor()
+                for command in commands:
+                    cursor.execute(command)
+                cursor.close()
+        except Exception:  # pylint: disable=broad-except
+            return False
+        return True
+
+    def __call__(self):
+        """check out a connection"""
+        with self.lock:
+            connection, released = self.idle and self.idle.pop() or (None, 0)
+        if connection is not None:
+            idle_time = timeit.default_timer() - released
+            if idle_time < self.ping_interval or self.alive(connection):
+                return connection
+            self.discard(connection)
+        return self.connect()
+
+    def release(self, connection):
+        """check in a connection"""
+        if self.reset(connection):
+            with self.lock:
+                if len(self.idle) < self.size:
+                    self.idle.append((connection, timeit.default_timer()))
+                    return
+        self.discard(connection)
+
+    def discard(self, connection):
+        """close a connection that will not be reused"""
+        # pylint: disable=no-self-use
+        try:
+            connection.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    def close(self):
+        """close all idle connections"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+    def __len__(self):
+        return len(self.idle)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def connection_pool(factory, size=DEFAULT_POOL_SIZE, *args, **keywords):
+    """returns the process wide pool for the connection parameters
+
+        >>> import sqlite3
+        >>> pool = connection_pool(sqlite3.connect, database=':memory:')
+        >>> pool is connection_pool(sqlite3.connect, database=':memory:')
+        True
+        >>> pool is connection_pool(sqlite3.connect, database='other')
+        False
+    """
+    key = (factory, args, tuple(sorted(keywords.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                factory, size, *args, **keywords
+            )
+        else:
+            pool.size = size
+    return pool
+
 
 class Database(object):
     # pylint: disable=trailing-whitespace
@@ -175,9 +385,28 @@ class Database(object):
         self.lastrowid = None
 
     def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    @property
+    def identity(self):
+        """identifies the database, the same for every Database using it
+
+        Used to key process wide caches such as table schemas, which would
+        not outlive a request if keyed on the Database object.
+        """
+        factory, args, keywords = self.__factory, self.__args, self.__keywords
+        if isinstance(factory, ConnectionPool):
+            factory, args, keywords = (
+                factory.factory, factory.args, factory.keywords
+            )
+        return database_identity(factory, args, keywords)
+
+    @property
+    def connection(self):
+        """the underlying database connection, connected on demand"""
         if self.__connection is None:
             self.__connection = self.__factory(*self.__args, **self.__keywords)
-        return getattr(self.__connection, name)
+        return self.__connection
 
     def _execute(self, cursor, method, command, *args):
         """execute the SQL command"""
@@ -220,9 +449,27 @@ class Database(object):
     def __call__(self, command, *args):
         return self.execute(command, *args)
 
+    def close(self):
+        """close the connection or return it to its pool"""
+        if self.__connection is not None:
+            release = getattr(self.__factory, 'release', None)
+            if release:
+                release(self.__connection)
+            else:
+                self.__connection.close()
+            self.__connection = None
+
     def use(self, name):
         """use another database on the same instance"""
         # pylint: disable=star-args
+        if isinstance(self.__factory, ConnectionPool):
+            pool = self.__factory
+            keywords = dict(pool.keywords, db=name)
+            other = connection_pool(pool.factory, pool.size, *pool.args,
+                                    **keywords)
+            other.autocommit = pool.autocommit
+            other.reset_commands = pool.reset_commands
+            return Database(other)
         args = list(self.__args)
         keywords = dict(self.__keywords, db=name)
         return Database(self.__factory, *args, **keywords)
@@ -243,11 +490,24 @@ def database(
     *a,
     **k
 ):
-    """create a database object"""
+    """create a database object
+
+    Passing a pool_size keeps MySQL connections open in a process wide
+    pool so they can be reused by subsequent requests.
+    """
     # pylint: disable=invalid-name
 
+    pool_size = k.pop('pool_size', 0)
+
     if engine == 'mysql':
         import MySQLdb
+        if pool_size:
+            pool = connection_pool(
+                MySQLdb.connect, pool_size, host=host, db=db, user=user, *a, **k
+            )
+            pool.autocommit = True
+            pool.reset_commands = MYSQL_RESET_COMMANDS
+            return Database(pool)
         db = Database(MySQLdb.connect, host=host, db=db, user=user, *a, **k)
         db.autocommit(1)
         return db
@@ -259,6 +519,20 @@ def database(
 
     elif engine == 'pymysql':
         import pymysql
+        if pool_size:
+            pool = connection_pool(
+                pymysql.connect,
+                pool_size,
+                host=host,
+                db=db,
+                user=user,
+                charset='utf8',
+                *a,
+                **k
+            )
+            pool.autocommit = True
+            pool.reset_commands = MYSQL_RESET_COMMANDS
+            return Database(pool)
         db = Database(
             pymysql.connect,
             host=host,
@@ -16,11 +16,15 @@ class SearchTerm(object):
     def visit(self, visitor, *a, **k):
         return visitor(self, *a, **k)
 
+    @property
+    def sql_operator(self):
+        return self.operator
+
 class LessThan(SearchTerm): operator = '<'
 class LessThanOrEqualTo(SearchTerm): operator = '<='
 class GreaterThan(SearchTerm): operator = '>'
 class GreaterThanOrEqualTo(SearchTerm): operator = '>='
-class Equal(SearchTerm): operator = '=='
+class Equal(SearchTerm): operator, sql_operator = '==', '='
 class NotEqual(SearchTerm): operator = '<>'
 class Occurs(SearchTerm): operator = ' in '
 lt = LessThan
@@ -91,23 +95,60 @@ def mysql_query(table, *a, **k):
     return cmd % (a and ','.join(a) or '*', table, expr), values
 
 
+def where_clause(**k):
+    """
+    generate a where clause with a corresponding parameters list
+
+        >>> where_clause(name='Joe', age=lt(3))
+        ('age<%s and name=%s', [3, 'Joe'])
+
+        >>> where_clause(name=occurs(['Joe', 'Sam']), kids=None)
+        ('kids is null and name in (%s,%s)', ['Joe', 'Sam'])
+
+        >>> where_clause(name=[])
+        ('0', [])
+
+        >>> where_clause()
+        ('', [])
+
+    """
+    clauses, values = [], []
+    for name, value in sorted(k.items()):
+        if isinstance(value, (list, tuple)):
+            value = Occurs(value)
+        if value is None:
+            clauses.append('%s is null' % name)
+        elif isinstance(value, Occurs):
+            items = list(value.value)
+            if not items:
+                return '0', []
+            clauses.append('%s in (%s)' % (name, ','.join(['%s'] * len(items))))
+            values.extend(items)
+        elif isinstance(value, SearchTerm):
+            clauses.append('%s%s%%s' % (name, value.sql_operator))
+            values.append(value.value)
+        else:
+            clauses.append('%s=%%s' % name)
+            values.append(value)
+    return ' and '.join(clauses), values
+
+
 def store_query(kind, *a,**k):
     """
     generate a query for an EntityStore
 
         >>> print store_query('person', name='Joe', age=gt(25))
-        select row_id from entites where
-          row_id in (select row_id from entities where kind='person' and entity='age' and value>25) and
-          row_id in (select row_id from entities where kind='person' and entity='name' and value='Joe')
+        select distinct row_id from attributes where kind='person' and
+          row_id in (select row_id from attributes where kind='person' and attribute='age' and value>25) and
+          row_id in (select row_id from attributes where kind='person' and attribute='name' and value='Joe')
 
     """
-    p = '(select row_id from entities where kind=%s and entity=%s and value%s%s)' 
+    p = '(select row_id from attributes where kind=%s and attribute=%s and value%s%s)'
     def visitor(term, name):
-        return p % (repr(kind), repr(name), term.operator, repr(term.value))
+        return p % (repr(kind), repr(name), term.sql_operator, repr(term.value))
     def express(k, v):
         if isinstance(v, SearchTerm):
             return v.visit(visitor, k)
         else:
             return p % (repr(kind), repr(k), '=', repr(v))
-    return 'select row_id from entites where\n' + ' and\n'.join('  row_id in %s' % express(k, v) for k,v in k.items())
-
+    return 'select distinct row_id from attributes where kind=%r and\n' % kind + ' and\n'.join('  row_id in %s' % express(k, v) for k,v in k.items())
@@ -13,14 +13,21 @@
 
 import os
 import sys
+import time
 import traceback
 import json
+from hashlib import md5
+from email.utils import formatdate, parsedate_tz, mktime_tz
 from StringIO import StringIO
 
+from .cache import LocalCache
 from .response import (
     PNGResponse, JPGResponse, CSSResponse, JavascriptResponse
 )
 
+RESPONSE_CACHE_LIFE = 300  # seconds
+VARIANT_LIFE = 600  # seconds
+
 
 SAMPLE_FORM = """<br><br>
 <form action="" id="dz_form" name="dz_form" method="POST" enctype="multipart/form-data">
@@ -193,6 +200,118 @@ def trap_errors(request, handler, *rest):
         return status, headers, content
 
 
+responses = LocalCache()
+variants = LocalCache(entries=10000)
+
+
+def cache_response(seconds=RESPONSE_CACHE_LIFE):
+    """let the response to the current request be served from the cache
+
+    Called by an app while handling a route to opt that route in to
+    cache_responses.  Only suitable for content that depends on nothing
+    but the route, query string, theme, the groups of the user and, for
+    an authenticated user, who they are.
+    """
+    from zoom.request import request
+    request.cache_response = seconds
+
+
+def response_key(request, variant):
+    """key a cached response is stored under"""
+    return repr((request.host, request.path, request.query, variant))
+
+
+def validators(etag, modified, expiry):
+    """headers that let the client cache and revalidate a response"""
+    age = max(0, int(round(expiry - time.time())))
+    return [
+        ('ETag', etag),
+        ('Last-Modified', formatdate(modified, usegmt=True)),
+        ('Cache-Control', 'private, max-age=%d' % age),
+    ]
+
+
+def not_modified(request, status, headers, content):
+    """answer a conditional request for content the client already has"""
+    values = dict(headers)
+    match = request.env.get('HTTP_IF_NONE_MATCH')
+    since = request.env.get('HTTP_IF_MODIFIED_SINCE')
+    if match:
+        tags = [tag.strip() for tag in match.split(',')]
+        fresh = '*' in tags or values['ETag'] in tags
+    elif since:
+        since, modified = [
+            parsedate_tz(value) for value in (since, values['Last-Modified'])
+        ]
+        fresh = bool(since and mktime_tz(since) >= mktime_tz(modified))
+    else:
+        fresh = False
+    if fresh:
+        names = 'ETag', 'Last-Modified', 'Cache-Control'
+        return '304 Not Modified', [h for h in headers if h[0] in names], ''
+    return status, headers, content
+
+
+def cache_responses(request, handler, *rest):
+    """serve cached responses for routes apps have opted in
+
+    Responses are cached in this process by site, path, query string, theme
+    and group set, and by user for authenticated users, so guests share
+    responses but users never see each other's.  The variant that goes
+    with a session is learned from the last opted in response generated
+    for it, and forgotten whenever the session makes any other request
+    that goes to the app, so logging in or out is seen straight away.
+    Responses that contain the session's CSRF token are not cached.
+    Cached responses carry no cookies and do not extend the session.
+    """
+    identity = request.session_token, request.user
+    if request.method != 'GET':
+        variants.delete(identity)
+        return handler(request, *rest)
+
+    variant = variants.get(identity)
+    if variant is not None:
+        cached = responses.get(response_key(request, variant))
+        if cached is not None:
+            status, headers, content, etag, modified, expiry = cached
+            headers = headers + validators(etag, modified, expiry)
+            return not_modified(request, status, headers, content)
+
+    variants.delete(identity)
+    status, headers, content = handler(request, *rest)
+
+    seconds = getattr(request, 'cache_response', None)
+    if seconds and status.startswith('200'):
+        from zoom.system import system
+        from zoom.user import user
+
+        token = getattr(system.session, 'csrf_token', None)
+        if token and token in content:
+            return status, headers, content
+
+        now = time.time()
+        expiry = now + seconds
+        variant = (
+            system.theme,
+            tuple(sorted(user.groups)),
+            getattr(user, 'is_authenticated', False) and user.user_id or None,
+        )
+        variants.put(identity, variant, now + VARIANT_LIFE)
+
+        etag = '"%s"' % md5(content).hexdigest()
+        headers = [h for h in headers if h[0].lower() != 'cache-control']
+        shared = [h for h in headers if h[0].lower() != 'set-cookie']
+        responses.put(
+            response_key(request, variant),
+            (status, shared, content, etag, now, expiry),
+            expiry,
+        )
+        headers = headers + validators(etag, now, expiry)
+        return not_modified(request, status, headers, content)
+
+    return status, headers, content
+
+
 def _handle(request, handler, *rest):
     """invoke the next handler"""
     return handler(request, *rest)
@@ -207,6 +326,7 @@ def handle(request, handlers=None):
         serve_themes,
         serve_images,
         serve_html,
+        cache_responses,
         #capture_stdout,
         #trap_errors,
         app,
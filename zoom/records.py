@@ -5,10 +5,35 @@
 """
 
 import datetime
+import itertools
 import decimal
+import time
+import weakref
 
 import zoom.exceptions
-from zoom.utils import Record, RecordList, kind
+from zoom.utils import Record, RecordList, kind, chunks, row_type
+from zoom.expressions import where_clause
+
+PAGE_SIZE = 50
+CHUNK_SIZE = 1000
+MAX_LIMIT = 18446744073709551615  # mysql idiom for limit with no upper bound
+COLUMNS_TTL = 300  # seconds table columns are cached for
+
+VALID_TYPES = [
+    str,
+    unicode,
+    long,
+    int,
+    float,
+    datetime.date,
+    datetime.datetime,
+    bool,
+    type(None),
+    decimal.Decimal,
+]
+
+_columns = {}
+_unidentified_columns = weakref.WeakKeyDictionary()
 
 
 def setup_test():
@@ -52,6 +77,127 @@ def setup_test():
     return db
 
 
+def get_columns(db, table, ttl=COLUMNS_TTL):
+    """
+    returns the names and types of the columns of a table
+
+    Columns are cached per database and table for ttl seconds.
+
+        >>> db = setup_test()
+        >>> get_columns(db, 'account')
+        [('account_id', 'int(11)'), ('name', 'varchar(100)'), ('added', 'date')]
+    """
+    def columns():
+        return [(rec[0], rec[1]) for rec in db('describe ' + table)]
+    return cached_schema(db, table, 'columns', columns, ttl)
+
+
+def get_fulltext_columns(db, table, ttl=COLUMNS_TTL):
+    """
+    returns the columns of the first fulltext index of a table, if any
+
+    Like columns, indexes are cached per database and table.
+
+        >>> db = setup_test()
+        >>> get_fulltext_columns(db, 'person')
+        []
+    """
+    def fulltext():
+        indexes = {}
+        for rec in db('show index from ' + table):
+            if rec[10] == 'FULLTEXT':
+                indexes.setdefault(rec[2], []).append((rec[3], rec[4]))
+        for name in sorted(indexes):
+            return [column for _, column in sorted(indexes[name])]
+        return []
+    return cached_schema(db, table, 'fulltext', fulltext, ttl)
+
+
+def schema_cache(db):
+    """
+    returns the process wide schema cache of a database
+
+    Caches are shared by every Database object on the same database, so
+    they outlive the request that created them.
+
+        >>> import sqlite3
+        >>> from zoom.db import Database
+        >>> a, b = [Database(sqlite3.connect, database='a') for _ in 'ab']
+        >>> schema_cache(a) is schema_cache(b)
+        True
+        >>> schema_cache(a) is schema_cache(Database(sqlite3.connect, 'b'))
+        False
+    """
+    identity = getattr(db, 'identity', None)
+    if identity is None:
+        return _unidentified_columns.setdefault(db, {})
+    return _columns.setdefault(identity, {})
+
+
+def cached_schema(db, table, aspect, compute, ttl=COLUMNS_TTL):
+    """returns a cached aspect of a table schema, computing it if needed"""
+    tables = schema_cache(db)
+    cached = tables.get((table, aspect))
+    now = time.time()
+    if cached is None or cached[0] < now:
+        cached = tables[(table, aspect)] = now + ttl, compute()
+    return cached[1]
+
+
+def invalidate_columns(db, table=None):
+    """
+    forgets the cached columns and indexes of a table, or of all tables
+
+        >>> db = setup_test()
+        >>> len(get_columns(db, 'account'))
+        3
+        >>> _ = db('alter table account add column notes text')
+        >>> len(get_columns(db, 'account'))
+        3
+        >>> invalidate_columns(db, 'account')
+        >>> len(get_columns(db, 'account'))
+        4
+    """
+    tables = schema_cache(db)
+    for key in tables.keys():
+        if table is None or key[0] == table:
+            del tables[key]
+
+
+def consecutive_keys(db):
+    """
+    returns True if a multi-row insert is given consecutive keys
+
+    That holds when keys increase by one and InnoDB is not using the
+    interleaved auto-increment lock mode (the MySQL 8 default), in which
+    concurrent inserts can take keys from the middle of a statement's
+    range.  Cached like the table schemas.
+    """
+    def consecutive():
+        cmd = 'select @@auto_increment_increment, @@innodb_autoinc_lock_mode'
+        increment, lock_mode = list(db(cmd))[0]
+        return increment == 1 and lock_mode != 2
+    return cached_schema(db, None, 'consecutive_keys', consecutive)
+
+
+def escape_like(text):
+    r"""
+    escapes the characters that are special to a LIKE pattern
+
+        >>> print escape_like(r'50%_off\now')
+        50\%\_off\\now
+    """
+    return text.replace('\\', '\\\\').replace('%', r'\%').replace('_', r'\_')
+
+
+def check_types(values):
+    """raises TypeException unless values are all of storable types"""
+    for value in values:
+        if type(value) not in VALID_TYPES:
+            msg = 'unsupported type <type %s>' % type(value)
+            raise zoom.exceptions.TypeException(msg)
+
+
 def get_result_iterator(rows, cls):
     """returns an iterator that iterates over the rows and zips the names onto
     the items being iterated so they come back as dicts"""
@@ -60,6 +206,15 @@ def get_result_iterator(rows, cls):
         yield cls((k, v) for k, v in zip(names, rec) if v is not None)
 
 
+def get_row_iterator(rows, _=None):
+    """returns an iterator that iterates over the rows as compact read only
+    records, which unlike dicts include columns that are null"""
+    names = [d[0] == 'id' and '_id' or d[0] for d in rows.cursor.description]
+    cls = row_type(names)
+    for rec in rows:
+        yield cls(rec)
+
+
 class Result(object):
     """rows resulting from a method call"""
     # pylint: disable=too-few-public-methods
@@ -256,27 +411,10 @@ class RecordStore(object):
         table_attributes = self.get_attributes()
         keys = [k for k in record.keys() if k != '_id' and k in table_attributes]
         values = [record[k] for k in keys]
-        datatypes = [type(i) for i in values]
-        values = [i for i in values]
-        valid_types = [
-            str,
-            unicode,
-            long,
-            int,
-            float,
-            datetime.date,
-            datetime.datetime,
-            bool,
-            type(None),
-            decimal.Decimal,
-        ]
 
         # pylint: disable=star-args
 
-        for atype in datatypes:
-            if atype not in valid_types:
-                msg = 'unsupported type <type %s>' % atype
-                raise zoom.exceptions.TypeException(msg)
+        check_types(values)
 
         if self.id_name in record:
             _id = record[self.id_name]
@@ -298,6 +436,84 @@ class RecordStore(object):
 
         return _id
 
+    def put_many(self, records, chunk_size=CHUNK_SIZE):
+        """
+        stores many records using multi-row statements
+
+        Runs of records that provide the same columns are stored together.
+        New records are added with one insert per run and chunk when the
+        database assigns consecutive keys to the rows of a multi-row insert
+        (see consecutive_keys), and with one insert per record otherwise,
+        so new keys follow the order of the records.  Records that have
+        keys are upserted with insert ... on duplicate key update.
+
+            >>> db = setup_test()
+            >>> class Person(Record): pass
+            >>> class People(RecordStore): pass
+            >>> people = People(db, Person)
+            >>> people.put_many([
+            ...     Person(name='Sam', age=25),
+            ...     Person(name='Sally'),
+            ...     Person(name='Jim', age=30),
+            ... ])
+            [1L, 2L, 3L]
+            >>> sally = people.get(2)
+            >>> sally.age = 40
+            >>> people.put_many([sally, Person(name='Al', age=5)])
+            [2L, 4L]
+            >>> print people
+            person
+            _id name  age
+            --- ----- ---
+              1 Sam    25
+              2 Sally  40
+              3 Jim    30
+              4 Al      5
+            4 person records
+
+        """
+        records = list(records)
+        table_attributes = self.get_attributes()
+
+        def columns_of(record):
+            return self.id_name in record, tuple(sorted(
+                k for k in record.keys()
+                if k not in ('_id', self.key) and k in table_attributes
+            ))
+
+        for (existing, names), group in itertools.groupby(records, columns_of):
+            group = list(group)
+            columns = existing and (self.key,) + names or names
+            slots = '(' + ','.join(['%s'] * len(columns)) + ')'
+            updates = ', '.join(
+                '{0}=values({0})'.format(name) for name in names
+            ) or '{0}={0}'.format(self.key)
+            multi_row = existing or consecutive_keys(self.db)
+            for batch in chunks(group, multi_row and chunk_size or 1):
+                values = []
+                for record in batch:
+                    row = [record[name] for name in names]
+                    check_types(row)
+                    if existing:
+                        row.insert(0, record[self.id_name])
+                    values.extend(row)
+                cmd = 'insert into {} ({}) values {}'.format(
+                    self.kind,
+                    ', '.join(columns),
+                    ','.join([slots] * len(batch)),
+                )
+                if existing:
+                    cmd += ' on duplicate key update ' + updates
+                    self.db(cmd, *values)
+                else:
+                    first_id = self.db(cmd, *values)
+                    for n, record in enumerate(batch):
+                        record['_id'] = first_id + n
+
+        return [
+            record.get(self.id_name, record.get('_id')) for record in records
+        ]
+
     def get(self, keys):
         # pylint: disable=trailing-whitespace
         """
@@ -380,9 +596,20 @@ class RecordStore(object):
             ['name', 'age', 'kids', 'birthdate']
 
         """
-        cmd = 'describe %s' % self.kind
-        rows = self.db(cmd)
-        return [rec[0] for rec in rows if rec[0] != 'id']
+        return [name for name, _ in self.get_columns() if name != 'id']
+
+    def get_columns(self):
+        """
+        get the names and types of the table columns
+
+            >>> db = setup_test()
+            >>> class Person(Record): pass
+            >>> people = RecordStore(db, Person)
+            >>> dict(people.get_columns())['birthdate']
+            'date'
+
+        """
+        return get_columns(self.db, self.kind)
 
     def _delete(self, ids):
         if ids:
@@ -550,19 +777,27 @@ class RecordStore(object):
         """
         Find keys that meet search critieria
         """
-        items = kv.items()
-        clause = ' and '.join('%s=%s' % (k, '%s') for k, v in items)
+        clause, values = self._where(kv)
         cmd = ' '.join([
             'select distinct',
             self.key,
             'from',
             self.kind,
-            'where',
             clause,
         ])
-        result = self.db(cmd, *[v for _, v in items])
+        result = self.db(cmd, *values)
         return [i[0] for i in result]
 
+    def _where(self, kv):
+        """
+        returns a where clause and parameters for search criteria
+        """
+        if self.id_name in kv and self.id_name != self.key:
+            kv = dict(kv)
+            kv[self.key] = kv.pop(self.id_name)
+        clause, values = where_clause(**kv)
+        return clause and 'where ' + clause or '', values
+
     def find(self, **kv):
         """
         finds entities that meet search criteria
@@ -589,11 +824,14 @@ class RecordStore(object):
             >>> len(people.find(name='Sam'))
             1
 
+            >>> from zoom.expressions import gt
+            >>> people.find(age=gt(30))
+            [<Person {'name': 'Sally', 'age': 55}>]
+
         """
-        items = kv.items()
-        where_clause = ' and '.join('%s=%s' % (k, '%s') for k, v in items)
-        cmd = 'select * from ' + self.kind + ' where ' + where_clause
-        result = self.db(cmd, *[v for _, v in items])
+        clause, values = self._where(kv)
+        cmd = 'select * from ' + self.kind + ' ' + clause
+        result = self.db(cmd, *values)
         return Result(result, self.record_class)
 
     def first(self, **kv):
@@ -660,21 +898,47 @@ class RecordStore(object):
             >>> list(people.search('smi 55'))
             [<Person {'name': 'Sally Mary Smith', 'age': 55}>]
 
+        The search runs in the database.  Each term has to occur in some
+        column, or, when the table has a fulltext index, the terms are
+        matched against that index instead.  Every column is searched, not
+        just the text columns, so numbers and dates still match as they
+        read, as they did when search compared the text of every value.
         """
-        def matches(item, terms):
-            """returns True if an item matches the given search terms"""
-            values = [str(i).lower() for i in item.values()]
-            return all(any(t in s for s in values) for t in terms)
-
-        search_terms = list(set([i.lower() for i in text.strip().split()]))
-        for rec in self:
-            if matches(rec, search_terms):
-                yield rec
-
-    def filter(self, function):
+        search_terms = sorted(set([i.lower() for i in text.strip().split()]))
+        if not search_terms:
+            return iter(self)
+
+        fulltext = get_fulltext_columns(self.db, self.kind)
+        if fulltext:
+            words = [
+                ''.join(c for c in term if c.isalnum() or c in '_.')
+                for term in search_terms
+            ]
+            clause = 'match({}) against (%s in boolean mode)'.format(
+                ', '.join(fulltext))
+            values = [' '.join('+%s*' % word for word in words if word)]
+        else:
+            columns = [name for name, _ in self.get_columns()]
+            condition = '(' + ' or '.join(
+                '{} like %s'.format(name) for name in columns) + ')'
+            clause = ' and '.join([condition] * len(search_terms))
+            values = [
+                '%' + escape_like(term) + '%'
+                for term in search_terms
+                for _ in columns
+            ]
+        cmd = 'select * from {} where {} order by {}'.format(
+            self.kind, clause, self.key)
+        return iter(Result(self.db(cmd, *values), self.record_class))
+
+    def filter(self, function=None, **terms):
         """
         finds records that satisfiy filter
 
+        Search terms, which can be zoom.expressions search terms, are
+        evaluated by the database; function, if provided, is then applied
+        to the records found.
+
             >>> db = setup_test()
             >>> class Person(Record): pass
             >>> class People(RecordStore): pass
@@ -690,9 +954,17 @@ class RecordStore(object):
             ... )
             True
 
+            >>> from zoom.expressions import lt
+            >>> repr(list(people.filter(age=lt(40)))) == (
+            ...     "[<Person {'name': 'Sam Adam Jones', 'age': 25}>, "
+            ...     "<Person {'name': 'Bob Marvin Smith', 'age': 25}>]"
+            ... )
+            True
+
         """
-        for rec in self:
-            if function(rec):
+        records = self.find(**terms) if terms else self
+        for rec in records:
+            if function is None or function(rec):
                 yield rec
 
     def __iter__(self):
@@ -720,13 +992,86 @@ class RecordStore(object):
             105
 
         """
-        cmd = 'select * from '+self.kind
-        rows = self.db(cmd)
-        return get_result_iterator(rows, self.record_class)
+        return self.stream()
+
+    def stream(self, chunk_size=CHUNK_SIZE, compact=False):
+        """
+        iterates through records in key order
+
+        Records are retrieved a chunk at a time so memory use stays bounded
+        no matter how large the table is.  With compact set records come
+        back as read only zoom.utils.Row objects, which are much smaller
+        than Records.
+
+            >>> db = setup_test()
+            >>> class Person(Record): pass
+            >>> class People(RecordStore): pass
+            >>> people = People(db, Person)
+            >>> for name in 'abcde':
+            ...     id = people.put(Person(name=name))
+            >>> ''.join(person.name for person in people.stream(2))
+            'abcde'
+            >>> people.stream(compact=True).next()
+            <Row {'_id': 1L, 'name': 'a', 'age': None, 'kids': None, 'birthdate': None}>
+
+        """
+        iterate = compact and get_row_iterator or get_result_iterator
+        cmd = 'select * from {0} order by {1} limit %s'.format(
+            self.kind, self.key)
+        next_cmd = 'select * from {0} where {1}>%s order by {1} limit %s'.format(
+            self.kind, self.key)
+        rows = self.db(cmd, chunk_size)
+        while True:
+            count = 0
+            for rec in iterate(rows, self.record_class):
+                count += 1
+                yield rec
+            if count < chunk_size:
+                break
+            rows = self.db(next_cmd, rec[self.id_name], chunk_size)
+
+    def _rows(self, offset=0, limit=None, after=None, descending=False):
+        """
+        returns records in key order
+        """
+        cmd = 'select * from ' + self.kind
+        params = []
+        if after is not None:
+            cmd += ' where {}{}%s'.format(self.key, descending and '<' or '>')
+            params.append(after)
+        cmd += ' order by ' + self.key + (descending and ' desc' or '')
+        if limit is not None or offset:
+            cmd += ' limit %s offset %s'
+            params.extend([limit is None and MAX_LIMIT or limit, offset])
+        return RecordList(Result(self.db(cmd, *params), self.record_class))
+
+    def page(self, after=None, size=PAGE_SIZE):
+        """
+        retrieves the next page of records in key order
+
+        Pages are located by the key of the last record seen rather than
+        by position so the table never needs to be scanned up to the page.
+
+            >>> db = setup_test()
+            >>> class Person(Record): pass
+            >>> class People(RecordStore): pass
+            >>> people = People(db, Person)
+            >>> id = people.put(Person(name='Sam', age=25))
+            >>> id = people.put(Person(name='Sally', age=55))
+            >>> id = people.put(Person(name='Bob', age=25))
+            >>> [p.name for p in people.page(size=2)]
+            ['Sam', 'Sally']
+            >>> [p.name for p in people.page(after=2L, size=2)]
+            ['Bob']
+            >>> people.page(after=3L)
+            []
+
+        """
+        return self._rows(after=after, limit=size)
 
     def __getitem__(self, index):
         """
-        get item at index
+        get item or slice of items by position
 
             >>> db = setup_test()
             >>> class Person(Record): pass
@@ -746,10 +1091,43 @@ class RecordStore(object):
             ... except IndexError:
             ...     print 'out of range'
             out of range
-
+            >>> people[-1]
+            <Person {'name': 'Bob', 'age': 25}>
+            >>> [p.name for p in people[1:]]
+            ['Sally', 'Bob']
+            >>> [p.name for p in people[::-2]]
+            ['Bob', 'Sam']
 
         """
-        return self.all()[index]
+        if isinstance(index, slice):
+            start, stop, step = index.start or 0, index.stop, index.step or 1
+            if step > 0 and start >= 0 and (stop is None or stop >= 0):
+                # positions known without counting the records
+                limit = None
+                if stop is not None:
+                    limit = stop - start
+                    if limit <= 0:
+                        return RecordList()
+                return RecordList(self._rows(offset=start, limit=limit)[::step])
+            positions = xrange(*index.indices(len(self)))
+            if not positions:
+                return RecordList()
+            low = min(positions[0], positions[-1])
+            high = max(positions[0], positions[-1])
+            rows = self._rows(offset=low, limit=high - low + 1)
+            return RecordList(
+                rows[i - low] for i in positions if i - low < len(rows)
+            )
+        elif isinstance(index, (int, long)):
+            if index < 0:
+                rows = self._rows(offset=-index - 1, limit=1, descending=True)
+            else:
+                rows = self._rows(offset=index, limit=1)
+            if not rows:
+                raise IndexError('Index ({}) out of range'.format(index))
+            return rows[0]
+        else:
+            raise TypeError('Invalid argument type')
 
     def __str__(self):
         """
@@ -14,6 +14,11 @@ from timeit import default_timer as timer
 from .request import Request
 from . import middleware
 
+# imported here so it is among the modules reset_modules keeps, which
+# lets the local cache tier and its key locks last from one request to
+# the next instead of starting empty each time
+from . import cache  # pylint: disable=unused-import
+
 
 def reset_modules():
     """reset the modules to a known starting set
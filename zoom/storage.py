@@ -24,11 +24,16 @@ import datetime
 from system import system
 from tools import db
 
+from store import CONVERTERS as STORE_CONVERTERS
+
 from MySQLdb import IntegrityError
 
 class ValidException(Exception): pass
 class TypeException(Exception): pass
 
+# shared with the entity store except that unicode values are left as stored
+CONVERTERS = dict(STORE_CONVERTERS, unicode=None)
+
 def create_storage():
     db("""
     create table if not exists storage_entities (
@@ -199,47 +204,25 @@ class Model(object):
 
         cmd = 'select * from storage_values where kind=%s and row_id in (%s)' % ('%s',','.join(['%s']*len(keys)))
         entities = {}
+        converters = CONVERTERS
         rs = db(cmd,cls.kind(),*keys)
-
-        for rec in rs:
-            row_id = rec.ROW_ID
-            attribute = rec.ATTRIBUTE.lower()
-            if rec.DATATYPE == "str":
-                value = rec.VALUE
-            elif rec.DATATYPE == 'unicode':
-                value = rec.VALUE                
-            elif rec.DATATYPE == "long":
-                value = long(rec.VALUE)
-            elif rec.DATATYPE == "int":
-                value = int(rec.VALUE)
-            elif rec.DATATYPE == 'float':
-                value = float(rec.VALUE)
-            elif rec.DATATYPE == "datetime.date":
-                y = int(rec.VALUE[:4])
-                m = int(rec.VALUE[5:7])
-                d = int(rec.VALUE[8:10])
-                import datetime
-                value = datetime.date(y,m,d)
-            elif rec.DATATYPE == "datetime.datetime":
-                y = int(rec.VALUE[:4])
-                m = int(rec.VALUE[5:7])
-                d = int(rec.VALUE[8:10])
-                hr = int(rec.VALUE[11:13])
-                mn = int(rec.VALUE[14:16])
-                sc = int(rec.VALUE[17:19])
-                import datetime
-                value = datetime.datetime(y,m,d,hr,mn,sc)
-            elif rec.DATATYPE == 'bool':
-                value = (rec.VALUE == '1' or rec.VALUE == 'True')
-            elif rec.DATATYPE == 'NoneType':
-                value = None
-            elif rec.DATATYPE == 'instance':
-#                print 'dzstore:','(id=%s name="%s" type=%s value=%s)'%(rec.id,attribute,repr(rec.DATATYPE),repr(rec.VALUE))
-                value = long(rec.id)
+        if hasattr(rs, 'data'):
+            rs = rs.data
+
+        for rec_id, _, row_id, attribute, datatype, value in rs:
+            attribute = attribute.lower()
+            if datatype in converters:
+                convert = converters[datatype]
+                if convert is not None:
+                    value = convert(value)
+            elif datatype == 'instance':
+                value = long(rec_id)
             else:
-                print 'dzstore:',rec.DATATYPE,'not supported (name="%s" type=%s value=%s id=%s)'%(attribute,repr(rec.DATATYPE),repr(rec.VALUE),rec.id)
-                value = rec.VALUE
-            entities.setdefault(row_id,cls(_id=row_id)).__dict__[attribute] = value
+                print 'dzstore:',datatype,'not supported (name="%s" type=%s value=%s id=%s)'%(attribute,repr(datatype),repr(value),rec_id)
+            entity = entities.get(row_id)
+            if entity is None:
+                entity = entities[row_id] = cls(_id=row_id)
+            entity.__dict__[attribute] = value
 
         if len(keys)>1:
             result = EntityList()
@@ -4,6 +4,7 @@
     key value store
 """
 
+import uuid
 import datetime
 import decimal
 
@@ -11,6 +12,20 @@ import zoom.utils
 import zoom.tools
 import zoom.exceptions
 import zoom.jsonz
+from zoom.expressions import SearchTerm, Occurs
+from zoom.records import cached_schema
+from zoom.utils import chunks
+
+NUMERIC_TYPES = ['int', 'long', 'float', 'decimal.Decimal']
+DATE_TYPES = ['datetime.date', 'datetime.datetime']
+TEXT_TYPES = ['str', 'unicode']
+
+PAGE_SIZE = 50
+CHUNK_SIZE = 1000
+MAX_LIMIT = 18446744073709551615  # mysql idiom for limit with no upper bound
+
+# bounds for range comparisons of dates against the typed date_value column
+DATE_BOUNDS = {'>': ('>=', 1), '>=': ('>=', 0), '<': ('<', 0), '<=': ('<', 1)}
 
 
 def setup_test():
@@ -40,8 +55,26 @@ def setup_test():
                 )
             """
         )
+        db(
+            """
+            create table if not exists entity_indexes (
+                kind      varchar(100) not null,
+                attribute varchar(100) not null,
+                datatype  varchar(30),
+                value     text,
+                row_id    int not null,
+                num_value double,
+                date_value datetime,
+                KEY `row_id_key` (`row_id`),
+                KEY `kv` (`kind`, `attribute`, `value`(100)),
+                KEY `kn` (`kind`, `attribute`, `num_value`),
+                KEY `kd` (`kind`, `attribute`, `date_value`)
+                )
+            """
+        )
 
     def delete_test_tables(db):
+        db('drop table if exists entity_indexes')
         db('drop table if exists attributes')
         db('drop table if exists entities')
 
@@ -63,70 +96,281 @@ Entity = zoom.utils.Record
 EntityList = zoom.utils.RecordList
 
 
-def entify(rs, klass):
+def compare(alias, term, typed=False):
     """
-    converts query result into an EntityList
+    returns a condition comparing an attribute to a search term
+
+    Comparisons are restricted to attributes stored with a compatible
+    datatype and the stored value is cast to match the search term so
+    numbers and dates compare as numbers and dates rather than as text.
+    When typed is True the num_value and date_value columns are used
+    instead so the comparison can use an index.
+
+        >>> from zoom.expressions import gt, occurs
+        >>> compare('a0', gt(25))
+        ('a0.datatype in (%s,%s,%s,%s) and a0.value+0>%s', ['int', 'long', 'float', 'decimal.Decimal', 25])
+        >>> compare('a0', gt(datetime.date(2016, 1, 1)))
+        ('a0.datatype in (%s,%s) and cast(a0.value as date)>%s', ['datetime.date', 'datetime.datetime', datetime.date(2016, 1, 1)])
+        >>> compare('a0', occurs(['Joe', 'Sam']))
+        ('a0.value in (%s,%s)', ['Joe', 'Sam'])
+        >>> compare('a0', gt(25), typed=True)[0]
+        'a0.datatype in (%s,%s,%s,%s) and a0.num_value>%s'
+        >>> compare('a0', gt(datetime.date(2016, 1, 1)), typed=True)
+        ('a0.datatype in (%s,%s) and a0.date_value>=%s', ['datetime.date', 'datetime.datetime', datetime.date(2016, 1, 2)])
     """
-    entities = {}
+    value, operator = term.value, term.sql_operator
+    if isinstance(term, Occurs):
+        values = list(value)
+        return '{}.value in ({})'.format(
+            alias, ','.join(['%s'] * len(values))
+        ), values
+    elif isinstance(value, bool):
+        datatypes, column = ['bool'], '{}.value'
+        value = int(value)
+    elif isinstance(value, (int, long, float, decimal.Decimal)):
+        datatypes = NUMERIC_TYPES
+        column = typed and '{}.num_value' or '{}.value+0'
+    elif isinstance(value, datetime.datetime):
+        datatypes = DATE_TYPES
+        column = typed and '{}.date_value' or 'cast({}.value as datetime)'
+    elif isinstance(value, datetime.date):
+        datatypes, column = DATE_TYPES, 'cast({}.value as date)'
+        if typed and operator in DATE_BOUNDS:
+            # stored datetimes compare by date, so bound the whole day
+            operator, days = DATE_BOUNDS[operator]
+            column = '{}.date_value'
+            value += datetime.timedelta(days)
+    else:
+        datatypes, column = TEXT_TYPES, '{}.value'
+    condition = '{}.datatype in ({}) and {}{}%s'.format(
+        alias,
+        ','.join(['%s'] * len(datatypes)),
+        column.format(alias),
+        operator,
+    )
+    return condition, datatypes + [value]
 
-    if hasattr(rs, 'data'):  # maintain backward compatibility with
-        rs = rs.data         # legacy database module
 
-    for _, _, row_id, attribute, datatype, value in rs:
+def typed_columns(datatype, value):
+    """
+    returns the num_value and date_value columns for a stored value
+
+        >>> typed_columns('int', '25')
+        (25.0, None)
+        >>> typed_columns('datetime.date', '2016-01-20')
+        (None, '2016-01-20')
+        >>> typed_columns('float', 'inf')
+        (None, None)
+        >>> typed_columns('str', 'Joe')
+        (None, None)
+    """
+    if datatype in NUMERIC_TYPES:
+        number = float(value)
+        if number - number == 0:  # neither infinite nor nan
+            return number, None
+    elif datatype in DATE_TYPES:
+        return None, value
+    return None, None
 
-        if datatype == 'str':
-            pass
 
-        elif datatype == 'unicode' and isinstance(value, unicode):
-            pass
+def column_definition(datatypes, size=0, scale=0, digits=0):
+    """
+    returns a column type able to hold values stored with datatypes
+
+    size is the length of the longest stored value, scale the most digits
+    stored after a decimal point and digits the most stored before one.
+
+        >>> column_definition(['int', 'long', 'NoneType'])
+        'bigint'
+        >>> column_definition(['decimal.Decimal'], 6, 2, 3)
+        'decimal(5,2)'
+        >>> column_definition(['int', 'decimal.Decimal'], 6, 2, 6)
+        'decimal(8,2)'
+        >>> column_definition(['datetime.date'])
+        'date'
+        >>> column_definition(['str', 'unicode'], 20)
+        'varchar(255)'
+        >>> column_definition(['int', 'str'], 300)
+        'mediumtext'
+    """
+    types = set(datatypes) - set(['NoneType'])
+    integers = set(['bool', 'int', 'long'])
+    if not types:
+        return 'varchar(255)'
+    elif types == set(['bool']):
+        return 'tinyint(1)'
+    elif types <= integers:
+        return 'bigint'
+    elif types <= integers | set(['decimal.Decimal']):
+        return 'decimal({},{})'.format(
+            min(65, max(digits, 1) + scale), min(30, scale)
+        )
+    elif types <= integers | set(NUMERIC_TYPES):
+        return 'double'
+    elif types == set(['datetime.date']):
+        return 'date'
+    elif types <= set(DATE_TYPES):
+        return 'datetime'
+    elif types <= set(TEXT_TYPES) and size <= 255:
+        return 'varchar(255)'
+    return 'mediumtext'
+
+
+def total(integers, decimals, floats):
+    """
+    combines the partial sums of an attribute into one total
+
+    Integer and decimal values are summed exactly by the database and
+    floats as doubles, so the total is only a float if floats were
+    summed.  Sums come back as decimals with any padding left by the
+    casts.
+
+        >>> total(decimal.Decimal('15'), None, None)
+        15L
+        >>> total(decimal.Decimal('3'), decimal.Decimal('1.2500'), None)
+        Decimal('4.25')
+        >>> total(None, decimal.Decimal('2.00'), None)
+        Decimal('2')
+        >>> total(decimal.Decimal('3'), None, 0.5)
+        3.5
+        >>> total(None, None, None) is None
+        True
+    """
+    if floats is not None:
+        return float(integers or 0) + float(decimals or 0) + floats
+    if decimals is not None:
+        amount = decimal.Decimal(integers or 0) + decimals
+        if amount == amount.to_integral_value():
+            return amount.quantize(decimal.Decimal(1))
+        return amount.normalize()
+    if integers is not None:
+        return long(integers)
+    return None
+
+
+def projection(attributes):
+    """
+    returns a condition restricting attribute rows to those named
 
-        elif datatype == 'unicode':
-            value = value.decode('utf8')
+    The condition is None when only keys are wanted, which need no
+    attribute rows.
 
-        elif datatype == "long":
-            value = long(value)
+        >>> projection(None)
+        ('', [])
+        >>> projection(['Name', 'age', '_id'])
+        (' and attributes.attribute in (%s,%s)', ['name', 'age'])
+        >>> projection(['_id'])
+        (None, [])
+    """
+    if attributes is None:
+        return '', []
+    names = [name.lower() for name in attributes if name != '_id']
+    if not names:
+        return None, []
+    return ' and attributes.attribute in ({})'.format(
+        ','.join(['%s'] * len(names))
+    ), names
+
+
+def as_unicode(value):
+    """converts a stored unicode value"""
+    if isinstance(value, unicode):
+        return value
+    return value.decode('utf8')
+
+
+def as_date(value):
+    """converts a stored date value"""
+    return datetime.date(int(value[:4]), int(value[5:7]), int(value[8:10]))
+
+
+def as_datetime(value):
+    """converts a stored datetime value"""
+    return datetime.datetime(
+        int(value[:4]),
+        int(value[5:7]),
+        int(value[8:10]),
+        int(value[11:13]),
+        int(value[14:16]),
+        int(value[17:19]),
+    )
 
-        elif datatype == "int":
-            value = int(value)
 
-        elif datatype == 'float':
-            value = float(value)
+def as_bool(value):
+    """converts a stored bool value"""
+    return value == '1' or value == 'True'
 
-        elif datatype == 'decimal.Decimal':
-            value = decimal.Decimal(value)
 
-        elif datatype == "datetime.date":
-            y = int(value[:4])
-            m = int(value[5:7])
-            d = int(value[8:10])
-            value = datetime.date(y, m, d)
+def as_none(_):
+    """converts a stored None value"""
+    return None
 
-        elif datatype == "datetime.datetime":
-            y = int(value[:4])
-            m = int(value[5:7])
-            d = int(value[8:10])
-            hr = int(value[11:13])
-            mn = int(value[14:16])
-            sc = int(value[17:19])
-            value = datetime.datetime(y, m, d, hr, mn, sc)
 
-        elif datatype == 'bool':
-            value = (value == '1' or value == 'True')
+# converters for each stored datatype, None where the value is used as is
+CONVERTERS = {
+    'str': None,
+    'unicode': as_unicode,
+    'long': long,
+    'int': int,
+    'float': float,
+    'decimal.Decimal': decimal.Decimal,
+    'datetime.date': as_date,
+    'datetime.datetime': as_datetime,
+    'bool': as_bool,
+    'NoneType': as_none,
+    'list': zoom.jsonz.loads,
+    'tuple': zoom.jsonz.loads,
+}
 
-        elif datatype == 'NoneType':
-            value = None
 
-        elif datatype == 'instance':
-            value = long(rec.id)
+def decode(datatype, value):
+    """
+    converts a stored attribute value back to its original type
+
+        >>> decode('datetime.date', '2016-03-01')
+        datetime.date(2016, 3, 1)
+        >>> decode('bool', '1')
+        True
+    """
+    try:
+        convert = CONVERTERS[datatype]
+    except KeyError:
+        msg = 'unsupported data type: ' + repr(datatype)
+        raise zoom.exceptions.TypeException, msg
+    if convert is None:
+        return value
+    return convert(value)
 
-        elif datatype in ['list', 'tuple']:
-            value = zoom.jsonz.loads(value)
 
-        else:
+def entify(rs, klass):
+    """
+    converts query result into an EntityList
+    """
+    entities = {}
+    converters = CONVERTERS
+    last_id = entity = None
+
+    if hasattr(rs, 'data'):  # maintain backward compatibility with
+        rs = rs.data         # legacy database module
+
+    for _, _, row_id, attribute, datatype, value in rs:
+
+        try:
+            convert = converters[datatype]
+        except KeyError:
             msg = 'unsupported data type: ' + repr(datatype)
             raise zoom.exceptions.TypeException, msg
+        if convert is not None:
+            value = convert(value)
 
-        entities.setdefault(row_id, klass(_id=row_id))[attribute] = value
+        # rows usually arrive grouped by entity
+        if row_id != last_id:
+            entity = entities.get(row_id)
+            if entity is None:
+                entity = entities[row_id] = klass(_id=row_id)
+            last_id = row_id
+
+        entity[attribute] = value
 
     return EntityList(entities.values())
 
@@ -223,8 +467,29 @@ class EntityStore(object):
         >>> my_info = misc.get(id)
         >>> assert type(my_info['name'])==type(name)
 
+    Subclasses can declare attributes that are looked up often as
+    indexes.  Their values are also kept in the narrow entity_indexes
+    table, which find and friends then search instead of attributes.
+
+        >>> class Visits(EntityStore):
+        ...     indexes = ['session']
+        >>> visits = Visits(db, 'visit')
+        >>> visits.put_many([dict(session='abc', n=1), dict(session='xyz')])
+        [6L, 7L]
+        >>> visits.first(session='abc')
+        {'session': 'abc', '_id': 6L, 'n': 1}
+        >>> visits.delete(session='abc')
+        [6L]
+        >>> visits.first(session='abc')
+
     """
 
+    indexes = []
+
+    # whether attributes has the num_value and date_value columns added by
+    # setup/database/add_typed_values_patch.sql, None to check the table
+    typed_values = None
+
     def __init__(self, db, klass=dict):
         self.db = db
         self.klass = type(klass) == str and dict or klass
@@ -267,6 +532,262 @@ class EntityStore(object):
             >>> assert len(people.get(id).grades) == 2  # json dump/load will bring back all tuples as lists
             >>> db.close()
 
+        """
+        db = self.db
+
+        rows = all_rows = self._attribute_rows(entity)
+
+        if '_id' in entity:
+            id = entity['_id']
+            originals = dict(
+                (k.lower(), v) for k, v in entity.items() if k != '_id'
+            )
+            rows = self._update(id, rows, originals)
+        else:
+            db('insert into entities (kind) values (%s)', self.kind)
+            id = entity['_id'] = db.lastrowid
+
+        if rows:
+            param_list = [(self.kind, id) + row for row in self._typed(rows)]
+            db.cursor().executemany(self._insert_command(1), param_list)
+
+        self._index([(id, all_rows)])
+
+        return id
+
+    def _update(self, id, rows, originals):
+        """
+        updates the stored attributes of an entity that have changed
+
+        Changed attributes are updated in place and removed attributes are
+        deleted.  Returns the rows for attributes that are not stored yet.
+        """
+        db = self.db
+
+        cmd = (
+            'select id, attribute, datatype, value '
+            'from attributes where row_id=%s'
+        )
+        rs = db(cmd, id)
+        if hasattr(rs, 'data'):  # maintain backward compatibility with
+            rs = rs.data         # legacy database module
+
+        stored, removed = {}, []
+        for row_key, attribute, datatype, value in rs:
+            if attribute in stored:
+                removed.append(row_key)
+            else:
+                stored[attribute] = row_key, datatype, value
+
+        new_rows = []
+        for attribute, datatype, value in rows:
+            if attribute not in stored:
+                new_rows.append((attribute, datatype, value))
+                continue
+            row_key, stored_datatype, stored_value = stored.pop(attribute)
+            if stored_datatype != datatype or \
+                    decode(stored_datatype, stored_value) != originals[attribute]:
+                if self._has_typed_values():
+                    cmd = (
+                        'update attributes set datatype=%s, value=%s, '
+                        'num_value=%s, date_value=%s where id=%s'
+                    )
+                    params = typed_columns(datatype, value)
+                    db(cmd, datatype, value, params[0], params[1], row_key)
+                else:
+                    cmd = (
+                        'update attributes set datatype=%s, value=%s '
+                        'where id=%s'
+                    )
+                    db(cmd, datatype, value, row_key)
+
+        removed.extend(row_key for row_key, _, _ in stored.values())
+        if removed:
+            cmd = 'delete from attributes where id in ({})'.format(
+                ','.join(['%s'] * len(removed)))
+            db(cmd, *removed)
+
+        return new_rows
+
+    def put_many(self, entities, chunk_size=CHUNK_SIZE):
+        """
+        stores many entities using multi-row inserts
+
+        Keys for new entities are reserved with one insert per chunk under
+        a placeholder kind, read back in order and then given the store's
+        kind, so no assumption is made about the keys the database hands
+        out.  Existing entities have their attributes replaced with a
+        single delete per chunk.
+
+            >>> db = setup_test()
+            >>> class Person(Entity): pass
+            >>> class People(EntityStore): pass
+            >>> people = People(db, Person)
+            >>> people.put_many([Person(name='Sam', age=25), dict(name='Jo')])
+            [1L, 2L]
+            >>> sam, jo = people.get([1L, 2L])
+            >>> sam.age = 26
+            >>> people.put_many([sam, Person(name='Al')])
+            [1L, 3L]
+            >>> print people
+            person
+            _id name age
+            --- ---- ----
+              1 Sam  26
+              2 Jo   None
+              3 Al   None
+            3 person records
+            >>> db.close()
+
+        """
+        db = self.db
+
+        entities = list(entities)
+        rows = [self._attribute_rows(entity) for entity in entities]
+
+        existing = [e['_id'] for e in entities if '_id' in e]
+        for keys in chunks(existing, chunk_size):
+            cmd = 'delete from attributes where row_id in ({})'.format(
+                ','.join(['%s'] * len(keys)))
+            db(cmd, *keys)
+
+        new = [e for e in entities if '_id' not in e]
+        for batch in chunks(new, chunk_size):
+            placeholder = '~' + uuid.uuid4().hex
+            cmd = 'insert into entities (kind) values ' + ','.join(
+                ['(%s)'] * len(batch))
+            db(cmd, *[placeholder] * len(batch))
+            cmd = 'select id from entities where kind=%s order by id'
+            keys = [rec[0] for rec in db(cmd, placeholder)]
+            cmd = 'update entities set kind=%s where kind=%s'
+            db(cmd, self.kind, placeholder)
+            for key, entity in zip(keys, batch):
+                entity['_id'] = key
+
+        param_list = [
+            (self.kind, entity['_id']) + row
+            for entity, entity_rows in zip(entities, rows)
+            for row in self._typed(entity_rows)
+        ]
+        for batch in chunks(param_list, chunk_size):
+            cmd = self._insert_command(len(batch))
+            db(cmd, *[value for params in batch for value in params])
+
+        self._index(
+            [(entity['_id'], entity_rows)
+             for entity, entity_rows in zip(entities, rows)],
+            chunk_size
+        )
+
+        return [entity['_id'] for entity in entities]
+
+    def _has_typed_values(self):
+        """
+        returns True if the attributes table has typed value columns
+
+        The answer is cached for the process, per database, like the
+        table schemas used by RecordStore.
+        """
+        if self.typed_values is None:
+            cmd = "show columns from attributes like 'num_value'"
+            return cached_schema(
+                self.db, 'attributes', 'typed_values',
+                lambda: bool(list(self.db(cmd))),
+            )
+        return self.typed_values
+
+    def _typed(self, rows):
+        """
+        adds the typed value columns to attribute rows, if used
+        """
+        if self._has_typed_values():
+            return [row + typed_columns(*row[1:]) for row in rows]
+        return rows
+
+    def _insert_command(self, count):
+        """
+        returns an insert statement for count attribute rows
+        """
+        columns = 'kind, row_id, attribute, datatype, value'
+        slots = '(%s,%s,%s,%s,%s)'
+        if self._has_typed_values():
+            columns += ', num_value, date_value'
+            slots = '(%s,%s,%s,%s,%s,%s,%s)'
+        return 'insert into attributes ({}) values {}'.format(
+            columns, ','.join([slots] * count)
+        )
+
+    def _index(self, entities, chunk_size=CHUNK_SIZE):
+        """
+        replaces the index rows of entities
+
+        entities is a list of (key, attribute rows) pairs.
+        """
+        if not self.indexes:
+            return
+
+        db = self.db
+        indexed = set(name.lower() for name in self.indexes)
+
+        keys = [key for key, _ in entities]
+        for batch in chunks(keys, chunk_size):
+            cmd = 'delete from entity_indexes where row_id in ({})'.format(
+                ','.join(['%s'] * len(batch))
+            )
+            db(cmd, *batch)
+
+        param_list = [
+            (self.kind, attribute, datatype, value, key) +
+            typed_columns(datatype, value)
+            for key, rows in entities
+            for attribute, datatype, value in rows
+            if attribute in indexed
+        ]
+        for batch in chunks(param_list, chunk_size):
+            cmd = (
+                'insert into entity_indexes (kind, attribute, datatype, '
+                'value, row_id, num_value, date_value) values '
+            ) + ','.join(['(%s,%s,%s,%s,%s,%s,%s)'] * len(batch))
+            db(cmd, *[value for params in batch for value in params])
+
+    def reindex(self):
+        """
+        rebuilds the index rows of all entities of this kind
+
+        Needed after adding indexes to a store that already has entities.
+
+            >>> db = setup_test()
+            >>> people = EntityStore(db, 'person')
+            >>> people.put(dict(name='Sam', age=25))
+            1L
+            >>> people.indexes = ['name']
+            >>> people.first(name='Sam')
+            >>> people.reindex()
+            >>> people.first(name='Sam')
+            {'age': 25, '_id': 1L, 'name': 'Sam'}
+            >>> db.close()
+
+        """
+        self.db('delete from entity_indexes where kind=%s', self.kind)
+        names = [name.lower() for name in self.indexes]
+        if names:
+            cmd = (
+                'select row_id, attribute, datatype, value from attributes '
+                'where kind=%s and attribute in ({}) order by row_id'
+            ).format(','.join(['%s'] * len(names)))
+            rs = self.db(cmd, self.kind, *names)
+            if hasattr(rs, 'data'):  # maintain backward compatibility with
+                rs = rs.data         # legacy database module
+
+            entities = {}
+            for rec in rs:
+                entities.setdefault(rec[0], []).append(tuple(rec[1:4]))
+            self._index(sorted(entities.items()))
+
+    def _attribute_rows(self, entity):
+        """
+        returns the attribute, datatype and value of each entity attribute
+        as it will be stored
         """
         def fixval(d):
             if type(d) == datetime.datetime:
@@ -295,8 +816,6 @@ class EntityStore(object):
             else:
                 return t
 
-        db = self.db
-
         keys = [k for k in entity.keys() if k != '_id']
         values = [entity[k] for k in keys]
         datatypes = [get_type_str(v) for v in values]
@@ -312,29 +831,17 @@ class EntityStore(object):
                 msg = 'unsupported type <type %s> in value %r'
                 raise zoom.exceptions.TypeException, msg % (atype, keys[n])
 
-        if '_id' in entity:
-            id = entity['_id']
-            db('delete from attributes where row_id=%s', id)
-        else:
-            db('insert into entities (kind) values (%s)', self.kind)
-            id = entity['_id'] = db.lastrowid
-
-        n = len(keys)
         lkeys = [k.lower() for k in keys]
-        param_list = zip([self.kind]*n, [id]*n, lkeys, datatypes, values)
-        cmd = (
-            'insert into attributes ('
-            '    kind, row_id, attribute, datatype, value'
-            ') values (%s,%s,%s,%s,%s)'
-            )
-        db.cursor().executemany(cmd, param_list)
-
-        return id
+        return zip(lkeys, datatypes, values)
 
-    def get(self, keys):
+    def get(self, keys, attributes=None):
         """
         retrives entities
 
+        When attributes is provided only the named attributes are
+        retrieved, leaving other (possibly large) values in the database.
+        Putting such a partial entity back replaces the stored entity.
+
             >>> db = setup_test()
             >>> class Person(Entity): pass
             >>> class People(EntityStore): pass
@@ -366,6 +873,11 @@ class EntityStore(object):
               3 Alice  29 None
             2 person records
 
+            >>> people.get(1, attributes=['name'])
+            <Person {'name': 'Sam'}>
+            >>> people.get(1, attributes=['_id'])
+            <Person {}>
+
             >>> db.close()
         """
         if keys is None:
@@ -384,18 +896,133 @@ class EntityStore(object):
             else:
                 return None
 
-        cmd = 'select * from attributes where kind=%s and row_id in (%s)' % (
-            '%s', ','.join(['%s']*len(keys))
-            )
-        rs = self.db(cmd, self.kind, *keys)
-
-        result = entify(rs, self.klass)
+        condition, names = projection(attributes)
+        if condition is None:
+            cmd = (
+                'select distinct row_id from attributes '
+                'where kind=%s and row_id in ({})'
+            ).format(','.join(['%s'] * len(keys)))
+            result = self._keys_only(cmd, [self.kind] + keys)
+        else:
+            cmd = (
+                'select id, kind, row_id, attribute, datatype, value '
+                'from attributes where kind=%s and row_id in (%s)'
+            ) % (
+                '%s', ','.join(['%s']*len(keys))
+                )
+            rs = self.db(cmd + condition, self.kind, *(keys + names))
+            result = entify(rs, self.klass)
 
         if as_list:
             return result
         if result:
             return result[0]
 
+    def materialize(self, name=None, chunk_size=CHUNK_SIZE):
+        """
+        copies the entities into a table of their own
+
+        The table schema is inferred from the attributes and the
+        datatypes they are stored with, entities are copied a chunk at a
+        time keeping their keys and a RecordStore for the new table is
+        returned.  The table must not already exist.  Entities with an
+        attribute called id can't be materialized because the table uses
+        that column for their keys.
+
+            >>> db = setup_test()
+            >>> class Person(Entity): pass
+            >>> people = EntityStore(db, Person)
+            >>> people.put_many([
+            ...     Person(name='Sam', age=25),
+            ...     Person(name='Sally', birthdate=datetime.date(1992, 5, 5)),
+            ... ])
+            [1L, 2L]
+            >>> _ = db('drop table if exists person_table')
+            >>> records = people.materialize('person_table')
+            >>> len(records)
+            2
+            >>> records.get(1).name, records.get(1).age == 25
+            ('Sam', True)
+            >>> records.first(name='Sally').birthdate
+            datetime.date(1992, 5, 5)
+            >>> _ = db('drop table person_table')
+            >>> _ = people.put(Person(name='Jim', id='A123'))
+            >>> people.materialize('person_table')
+            Traceback (most recent call last):
+            ...
+            TypeException: attribute id is reserved for the entity key
+            >>> db.close()
+
+        """
+        from zoom.records import RecordStore
+
+        name = name or self.kind
+
+        cmd = (
+            'select attribute, datatype, max(length(value)), '
+            "max(case when locate('.', value) > 0 "
+            "then length(value) - locate('.', value) else 0 end), "
+            "max(case when locate('.', value) > 0 "
+            "then locate('.', value) - 1 else length(value) end) "
+            'from attributes where kind=%s group by attribute, datatype'
+        )
+        rs = self.db(cmd, self.kind)
+        if hasattr(rs, 'data'):  # maintain backward compatibility with
+            rs = rs.data         # legacy database module
+
+        observed = {}
+        for rec in rs:
+            attribute, datatype = rec[0], rec[1]
+            size, scale, digits = [int(n or 0) for n in rec[2:5]]
+            if attribute == 'id':
+                msg = 'attribute id is reserved for the entity key'
+                raise zoom.exceptions.TypeException(msg)
+            if datatype in ('list', 'tuple'):
+                msg = 'unsupported type %s for %s' % (datatype, attribute)
+                raise zoom.exceptions.TypeException(msg)
+            types, max_size, max_scale, max_digits = observed.get(
+                attribute, ([], 0, 0, 0)
+            )
+            observed[attribute] = (
+                types + [datatype],
+                max(max_size, size),
+                max(max_scale, scale),
+                max(max_digits, digits),
+            )
+
+        columns = self.get_attributes()
+        definitions = ['id int not null auto_increment'] + [
+            '`{}` {}'.format(column, column_definition(*observed[column]))
+            for column in columns
+        ] + ['PRIMARY KEY (id)']
+        self.db('create table `{}` ({})'.format(name, ', '.join(definitions)))
+
+        def copy(batch):
+            cmd = 'insert into `{}` (id, {}) values {}'.format(
+                name,
+                ', '.join('`{}`'.format(column) for column in columns),
+                ','.join(
+                    ['(' + ','.join(['%s'] * (len(columns) + 1)) + ')']
+                    * len(batch)
+                ),
+            )
+            params = []
+            for entity in batch:
+                params.append(entity['_id'])
+                params.extend(entity.get(column) for column in columns)
+            self.db(cmd, *params)
+
+        batch = []
+        for entity in self.stream(chunk_size):
+            batch.append(entity)
+            if len(batch) == chunk_size:
+                copy(batch)
+                batch = []
+        if batch:
+            copy(batch)
+
+        return RecordStore(self.db, self.klass, name=name)
+
     def get_attributes(self):
         """
         get complete set of attributes for the entity type
@@ -431,6 +1058,9 @@ class EntityStore(object):
             self.db(cmd, *ids)
             cmd = 'delete from entities where id in ({})'.format(spots)
             self.db(cmd, *ids)
+            if self.indexes:
+                cmd = 'delete from entity_indexes where row_id in ({})'
+                self.db(cmd.format(spots), *ids)
             return ids
 
     def delete(self, *args, **kwargs):
@@ -522,10 +1152,14 @@ class EntityStore(object):
             result = keys[0] in found_keys
         return result
 
-    def all(self):
+    def all(self, attributes=None, order_by=None, descending=False,
+            limit=None, offset=0):
         """
         Retrieves all entities
 
+        Entities can be ordered by an attribute and limited, with the
+        sorting and limiting done by the database.
+
             >>> db = setup_test()
             >>> class Person(Entity): pass
             >>> class People(EntityStore): pass
@@ -535,11 +1169,32 @@ class EntityStore(object):
             >>> id = people.put(Person(name='Joe', age=25))
             >>> people.all()
             [<Person {'name': 'Sally', 'age': 25}>, <Person {'name': 'Sam', 'age': 25}>, <Person {'name': 'Joe', 'age': 25}>]
+            >>> people.all(attributes=['name'])
+            [<Person {'name': 'Sally'}>, <Person {'name': 'Sam'}>, <Person {'name': 'Joe'}>]
+            >>> people.all(order_by='name', limit=2)
+            [<Person {'name': 'Joe', 'age': 25}>, <Person {'name': 'Sally', 'age': 25}>]
+            >>> people.all(order_by='name', descending=True, offset=2)
+            [<Person {'name': 'Joe', 'age': 25}>]
             >>> db.close()
 
         """
-        cmd = 'select * from attributes where kind="%s"' % (self.kind)
-        return entify(self.db(cmd), self.klass)
+        if order_by is not None or limit is not None or offset:
+            keys = self._ordered_keys(
+                'select distinct row_id from attributes where kind=%s',
+                [self.kind], order_by, descending, limit, offset
+            )
+            return self._get_in_order(keys, attributes)
+        condition, names = projection(attributes)
+        if condition is None:
+            return self._keys_only(
+                'select distinct row_id from attributes where kind=%s',
+                [self.kind],
+            )
+        cmd = (
+            'select id, kind, row_id, attribute, datatype, value '
+            'from attributes where kind=%s'
+        ) + condition
+        return entify(self.db(cmd, self.kind, *names), self.klass)
 
     def zap(self):
         """
@@ -564,6 +1219,9 @@ class EntityStore(object):
         self.db(cmd, self.kind)
         cmd = 'delete from entities where kind=%s'
         self.db(cmd, self.kind)
+        if self.indexes:
+            cmd = 'delete from entity_indexes where kind=%s'
+            self.db(cmd, self.kind)
 
     def __len__(self):
         """
@@ -587,36 +1245,89 @@ class EntityStore(object):
         r = self.db(cmd, self.kind)
         return int(list(r)[0][0])
 
+    def _find_query(self, kv):
+        """
+        Build a query selecting the keys that meet search criteria
+
+        Each criterion is a self join on the attributes table so the whole
+        search runs as one statement against the kv index.  Criteria can
+        be values, lists of values or zoom.expressions search terms.
+        Criteria on indexed attributes search the entity_indexes table.
+        Returns None when the criteria can not match anything.
+
+            >>> people = EntityStore(None, 'person')
+            >>> cmd, params = people._find_query(dict(name='Joe', age=[1, 2]))
+            >>> print cmd
+            select distinct a0.row_id from attributes a0, attributes a1 where a0.kind=%s and a0.attribute=%s and a0.value in (%s,%s) and a1.row_id=a0.row_id and a1.kind=%s and a1.attribute=%s and a1.value=%s
+            >>> params
+            ['person', 'age', 1, 2, 'person', 'name', 'Joe']
+
+            >>> people.indexes = ['name', 'age']
+            >>> print people._find_query(dict(name='Joe'))[0]
+            select distinct a0.row_id from entity_indexes a0 where a0.kind=%s and a0.attribute=%s and a0.value=%s
+
+        Range searches on indexed attributes use the typed value columns
+        of entity_indexes.
+
+            >>> from zoom.expressions import gt
+            >>> print people._find_query(dict(age=gt(30)))[0]
+            select distinct a0.row_id from entity_indexes a0 where a0.kind=%s and a0.attribute=%s and a0.datatype in (%s,%s,%s,%s) and a0.num_value>%s
+        """
+        indexed = set(name.lower() for name in self.indexes)
+        tables, clauses, params = [], [], []
+        for name, value in sorted(kv.items()):
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                value = Occurs(value)
+            if isinstance(value, Occurs) and not value.value:
+                return None
+            alias = 'a%d' % len(tables)
+            if tables:
+                clauses.append(alias + '.row_id=a0.row_id')
+            if name.lower() in indexed:
+                tables.append('entity_indexes ' + alias)
+            else:
+                tables.append('attributes ' + alias)
+            if isinstance(value, SearchTerm):
+                typed = not isinstance(value, Occurs) and (
+                    name.lower() in indexed or self._has_typed_values()
+                )
+                test, values = compare(alias, value, typed)
+            else:
+                test, values = alias + '.value=%s', [value]
+            clauses.append(
+                '{0}.kind=%s and {0}.attribute=%s and {1}'.format(alias, test)
+            )
+            params.extend([self.kind, name.lower()] + values)
+        if not tables:
+            return None
+        cmd = 'select distinct a0.row_id from {} where {}'.format(
+            ', '.join(tables),
+            ' and '.join(clauses),
+        )
+        return cmd, params
+
     def _find(self, **kv):
         """
         Find keys that meet search critieria
         """
-        db = self.db
-        all_keys = []
-        for field_name in kv.keys():
-            value = kv[field_name]
-            if value is not None:
-                if not isinstance(value, (list, tuple)):
-                    wc = 'value=%s'
-                    v = (value,)
-                else:
-                    wc = 'value in ('+','.join(['%s']*len(value))+')'
-                    v = value
-                cmd = 'select distinct row_id from attributes where kind=%s and attribute=%s and '+wc
-                rs = db(cmd, self.kind, field_name.lower(), *v)
-                all_keys.append([rec[0] for rec in rs])
-        answer = all_keys and set(all_keys[0]) or set()
-        for keys in all_keys[1:]:
-            answer = set(keys) & answer
-        if answer:
-            return list(answer)
-        else:
+        query = self._find_query(kv)
+        if query is None:
             return []
+        cmd, params = query
+        return [rec[0] for rec in self.db(cmd, *params)]
 
-    def find(self, **kv):
+    def find(self, attributes=None, order_by=None, descending=False,
+             limit=None, offset=0, **kv):
         """
         finds entities that meet search criteria
 
+        When attributes is provided only the named attributes of the
+        entities found are retrieved.  Entities can be ordered by an
+        attribute and limited, with the sorting and limiting done by the
+        database.
+
             >>> db = setup_test()
             >>> class Person(Entity): pass
             >>> class People(EntityStore): pass
@@ -636,12 +1347,51 @@ class EntityStore(object):
             >>> len(people.find(name='Sam'))
             1
 
+            >>> from zoom.expressions import gt, lt
+            >>> print people.find(age=gt(30))
+            person
+            _id name  age
+            --- ----- ---
+              2 Sally  55
+            1 person records
+
+            >>> len(people.find(age=lt(30), name='Bob'))
+            1
+
+            >>> people.find(name='Sally', attributes=['age'])
+            [<Person {'age': 55}>]
+            >>> people.find(name='Sally', attributes=['_id'])[0]._id
+            2L
+
+            >>> people.find(age=25, order_by='name')
+            [<Person {'name': 'Bob', 'age': 25}>, <Person {'name': 'Sam', 'age': 25}>]
+            >>> people.find(age=gt(1), order_by='age', descending=True, limit=1)
+            [<Person {'name': 'Sally', 'age': 55}>]
+
             >>> db.close()
 
         """
-        return self.get(self._find(**kv))
-
-    def first(self, **kv):
+        query = self._find_query(kv)
+        if query is None:
+            return EntityList()
+        cmd, params = query
+        if order_by is not None or limit is not None or offset:
+            keys = self._ordered_keys(
+                cmd, params, order_by, descending, limit, offset
+            )
+            return self._get_in_order(keys, attributes)
+        condition, names = projection(attributes)
+        if condition is None:
+            return self._keys_only(cmd, params)
+        cmd = (
+            'select id, kind, attributes.row_id, attribute, datatype, value '
+            'from attributes, ({}) found '
+            'where attributes.row_id=found.row_id and attributes.kind=%s{}'
+        ).format(cmd, condition)
+        params = params + [self.kind] + names
+        return entify(self.db(cmd, *params), self.klass)
+
+    def first(self, attributes=None, **kv):
         """
         finds the first entity that meet search criteria
 
@@ -655,16 +1405,21 @@ class EntityStore(object):
             >>> people.first(age=5)
             >>> people.first(age=25)
             <Person {'name': 'Sam', 'age': 25}>
+            >>> people.first(age=25, attributes=['name'])
+            <Person {'name': 'Sam'}>
             >>> db.close()
 
         """
-        for item in self.find(**kv):
+        for item in self.find(attributes=attributes, **kv):
             return item
 
     def last(self, **kv):
         """
         finds the last entity that meet search criteria
 
+        The last entity is the one with the highest key, the most recently
+        added.
+
             >>> db = setup_test()
             >>> class Person(Entity): pass
             >>> class People(EntityStore): pass
@@ -678,10 +1433,117 @@ class EntityStore(object):
             >>> db.close()
 
         """
-        rows = self._find(**kv)
-        if rows:
-            return self.get(rows[-1])
-        return None
+        query = self._find_query(kv)
+        if query is None:
+            return None
+        cmd, params = query
+        cmd = 'select max(found.row_id) from ({}) found'.format(cmd)
+        rs = self.db(cmd, *params)
+        if hasattr(rs, 'data'):  # maintain backward compatibility with
+            rs = rs.data         # legacy database module
+        for rec in rs:
+            return self.get(rec[0])
+
+    def aggregate(self, group_by=None, count=False, sum=None, **kv):
+        """
+        summarizes entities in the database
+
+        Entities meeting the search criteria are grouped by the values of
+        the group_by attributes and counted and/or summed, all in one
+        query.  Only numeric values are summed, integers and decimals
+        exactly, so a sum is only a float if floats were summed.  Returns
+        a RecordList with one record per group.
+
+            >>> db = setup_test()
+            >>> class Person(Entity): pass
+            >>> class People(EntityStore): pass
+            >>> people = People(db, Person)
+            >>> people.put_many([
+            ...     Person(name='Sam', team='red', score=10),
+            ...     Person(name='Sally', team='blue', score=20),
+            ...     Person(name='Bob', team='red', score=5),
+            ...     Person(name='Al', team='red'),
+            ... ])
+            [1L, 2L, 3L, 4L]
+            >>> for r in people.aggregate('team', count=True, sum='score'):
+            ...     print r.team, r.count, r.score
+            blue 1 20
+            red 3 15
+            >>> _ = people.put(Person(name='Sue', team='blue', score=1.5))
+            >>> [r.score for r in people.aggregate(sum='score')]
+            [36.5]
+            >>> [r.count for r in people.aggregate(count=True, team='red')]
+            [3L]
+            >>> db.close()
+
+        """
+        def as_list(names):
+            if names is None:
+                return []
+            if isinstance(names, basestring):
+                return [names]
+            return list(names)
+
+        groups, sums = as_list(group_by), as_list(sum)
+
+        if kv:
+            query = self._find_query(kv)
+            if query is None:
+                return zoom.utils.RecordList()
+            cmd, params = query
+        else:
+            cmd = 'select distinct row_id from attributes where kind=%s'
+            params = [self.kind]
+
+        columns, tables = [], ['({}) found'.format(cmd)]
+        partial_sums = (
+            "{0}.datatype in ('int', 'long') then cast({0}.value as signed)",
+            "{0}.datatype='decimal.Decimal' "
+            'then cast({0}.value as decimal(65,30))',
+            "{0}.datatype='float' then {0}.value+0",
+        )
+        for prefix, names in (('g', groups), ('s', sums)):
+            for n, name in enumerate(names):
+                alias = prefix + str(n)
+                tables.append(
+                    'left join attributes {0} on {0}.row_id=found.row_id '
+                    'and {0}.kind=%s and {0}.attribute=%s'.format(alias)
+                )
+                params.extend([self.kind, name.lower()])
+                if prefix == 'g':
+                    columns.extend([alias + '.datatype', alias + '.value'])
+                else:
+                    columns.extend(
+                        'sum(case when {} end)'.format(partial.format(alias))
+                        for partial in partial_sums
+                    )
+        if count:
+            columns.append('count(*)')
+        if not columns:
+            return zoom.utils.RecordList()
+
+        cmd = 'select {} from {}'.format(', '.join(columns), ' '.join(tables))
+        if groups:
+            grouping = ', '.join(columns[:len(groups) * 2])
+            cmd += ' group by {0} order by {0}'.format(grouping)
+
+        rs = self.db(cmd, *params)
+        if hasattr(rs, 'data'):  # maintain backward compatibility with
+            rs = rs.data         # legacy database module
+
+        result = zoom.utils.RecordList()
+        for rec in rs:
+            values = {}
+            for n, name in enumerate(groups):
+                datatype, value = rec[2 * n], rec[2 * n + 1]
+                values[name] = datatype and decode(datatype, value)
+            offset = 2 * len(groups)
+            for n, name in enumerate(sums):
+                values[name] = total(*rec[offset + 3 * n:offset + 3 * n + 3])
+            if count:
+                values['count'] = rec[offset + 3 * len(sums)]
+            result.append(zoom.utils.Record(values))
+        return result
 
     def search(self, text):
         """
@@ -741,7 +1603,136 @@ class EntityStore(object):
             105
 
         """
-        return self.all()
+        return self.stream()
+
+    def stream(self, chunk_size=CHUNK_SIZE, compact=False):
+        """
+        iterates through entities in key order
+
+        Entities are retrieved a chunk of keys at a time so memory use
+        stays bounded no matter how many entities there are.  With compact
+        set entities come back as read only zoom.utils.Row objects holding
+        every attribute of the kind, which are much smaller than entities.
+
+            >>> db = setup_test()
+            >>> class Person(Entity): pass
+            >>> class People(EntityStore): pass
+            >>> people = People(db, Person)
+            >>> people.put_many(Person(name=name) for name in 'abcde')
+            [1L, 2L, 3L, 4L, 5L]
+            >>> ''.join(person.name for person in people.stream(2))
+            'abcde'
+            >>> people.stream(compact=True).next()
+            <Row {'_id': 1L, 'name': 'a'}>
+            >>> db.close()
+
+        """
+        if compact:
+            names = ['_id'] + self.get_attributes()
+            cls = zoom.utils.row_type(names)
+        after = None
+        while True:
+            keys = self._keys(after=after, limit=chunk_size)
+            if not keys:
+                break
+            for entity in self._get_in_order(keys):
+                if compact:
+                    yield cls(entity.get(name) for name in names)
+                else:
+                    yield entity
+            after = keys[-1]
+
+    def _keys(self, offset=0, limit=None, after=None, descending=False):
+        """
+        returns entity keys in key order
+        """
+        cmd = 'select distinct row_id from attributes where kind=%s'
+        params = [self.kind]
+        if after is not None:
+            cmd += descending and ' and row_id<%s' or ' and row_id>%s'
+            params.append(after)
+        cmd += descending and ' order by row_id desc' or ' order by row_id'
+        if limit is not None or offset:
+            cmd += ' limit %s offset %s'
+            params.extend([limit is None and MAX_LIMIT or limit, offset])
+        return [rec[0] for rec in self.db(cmd, *params)]
+
+    def _keys_only(self, cmd, params):
+        """
+        returns entities holding only the keys a query selects
+        """
+        rs = self.db(cmd, *params)
+        if hasattr(rs, 'data'):  # maintain backward compatibility with
+            rs = rs.data         # legacy database module
+        return EntityList(self.klass(_id=rec[0]) for rec in rs)
+
+    def _get_in_order(self, keys, attributes=None):
+        """
+        retrieves entities in the same order as keys
+        """
+        found = self.get(list(keys), attributes=attributes)
+        entities = dict((e['_id'], e) for e in found)
+        return EntityList(entities[k] for k in keys if k in entities)
+
+    def _ordered_keys(self, cmd, params, order_by=None, descending=False,
+                      limit=None, offset=0):
+        """
+        returns the keys selected by a query in order
+
+        Ordering by an attribute joins that attribute's row so the
+        database does the sorting and limiting.  Numeric attributes sort
+        as numbers, entities without the attribute sort as nulls and
+        ties are broken by key.
+        """
+        direction = descending and ' desc' or ''
+        if order_by is None:
+            cmd = (
+                'select found.row_id from ({0}) found '
+                'order by found.row_id{1}'
+            ).format(cmd, direction)
+        else:
+            cmd = (
+                'select found.row_id from ({0}) found '
+                'left join attributes o on o.row_id=found.row_id '
+                'and o.kind=%s and o.attribute=%s '
+                'order by '
+                'case when o.datatype in ({1}) then o.value+0 end{2}, '
+                'o.value{2}, found.row_id{2}'
+            ).format(cmd, ','.join(['%s'] * len(NUMERIC_TYPES)), direction)
+            params = params + [self.kind, order_by.lower()] + NUMERIC_TYPES
+        if limit is not None or offset:
+            cmd += ' limit %s offset %s'
+            params = params + [limit is None and MAX_LIMIT or limit, offset]
+        return [rec[0] for rec in self.db(cmd, *params)]
+
+    def page(self, after=None, size=PAGE_SIZE):
+        """
+        retrieves the next page of entities in key order
+
+        Pages are located by the key of the last entity seen rather than
+        by position so the entities never need to be counted.
+
+            >>> db = setup_test()
+            >>> class Person(Entity): pass
+            >>> class People(EntityStore): pass
+            >>> people = People(db, Person)
+            >>> id = people.put(Person(name='Sam', age=25))
+            >>> id = people.put(Person(name='Sally', age=55))
+            >>> id = people.put(Person(name='Bob', age=25))
+
+            >>> people.page(size=2)
+            [<Person {'name': 'Sam', 'age': 25}>, <Person {'name': 'Sally', 'age': 55}>]
+
+            >>> people.page(after=2L, size=2)
+            [<Person {'name': 'Bob', 'age': 25}>]
+
+            >>> people.page(after=3L)
+            []
+
+            >>> db.close()
+
+        """
+        return self._get_in_order(self._keys(after=after, limit=size))
 
     def __getitem__(self, key):
         """
@@ -785,27 +1776,33 @@ class EntityStore(object):
             >>> db.close()
 
         """
-        n = len(self)
         if isinstance(key, slice):
-            # get the start, stop, and step from the slice
-            start, stop, step = key.indices(n)
-            return [self[ii] for ii in xrange(start, stop, step)]
-        elif isinstance(key, int):
+            start, stop, step = key.start or 0, key.stop, key.step or 1
+            if step > 0 and start >= 0 and (stop is None or stop >= 0):
+                # positions known without counting the entities
+                limit = None
+                if stop is not None:
+                    limit = stop - start
+                    if limit <= 0:
+                        return EntityList()
+                keys = self._keys(offset=start, limit=limit)[::step]
+            else:
+                positions = xrange(*key.indices(len(self)))
+                if not positions:
+                    return EntityList()
+                low = min(positions[0], positions[-1])
+                high = max(positions[0], positions[-1])
+                keys = self._keys(offset=low, limit=high - low + 1)
+                keys = [keys[i - low] for i in positions if i - low < len(keys)]
+            return self._get_in_order(keys)
+        elif isinstance(key, (int, long)):
             if key < 0:
-                key += n
-            elif key >= n:
-                raise IndexError('Index ({}) out of range'.format(key))
-            cmd = (
-                'select distinct row_id '
-                'from attributes '
-                'where kind="%s" '
-                'limit %s,1'
-                ) % (self.kind, key)
-            rs = self.db(cmd)
-            if rs:
-                return self.get(list(rs)[0][0])
+                keys = self._keys(offset=-key - 1, limit=1, descending=True)
             else:
-                return 'no records'
+                keys = self._keys(offset=key, limit=1)
+            if not keys:
+                raise IndexError('Index ({}) out of range'.format(key))
+            return self.get(keys[0])
         else:
             raise TypeError('Invalid argument type')
 
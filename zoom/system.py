@@ -9,7 +9,7 @@ import sys
 import timeit
 
 import zoom.config as cfg
-from zoom.database import database as old_database
+from zoom.database import database as old_database, shared_database
 from zoom.db import database as new_db
 from zoom.request import request
 from zoom.users import UserStore
@@ -211,16 +211,8 @@ class System(object):
         db_name = config.get('database', 'dbname', 'zoomdev')
         db_user = config.get('database', 'dbuser', 'testuser')
         db_pass = config.get('database', 'dbpass', 'password')
-
-        # legacy database module
-        self.database = old_database(
-            db_engine,
-            db_host,
-            db_name,
-            db_user,
-            db_pass,
-            db_port,
-            )
+        db_pool_size = int(config.get('database', 'pool_size', '0') or 0)
+        db_shared = config.get('database', 'shared', '0') in POSITIVE
 
         # database module
         db_params = dict(
@@ -233,9 +225,25 @@ class System(object):
             db_params['passwd'] = db_pass
         if db_port:
             db_params['port'] = int(db_port)
+        if db_pool_size:
+            db_params['pool_size'] = db_pool_size
         # pylint: disable=invalid-name
         self.db = new_db(**db_params)
 
+        # legacy database module
+        if db_shared:
+            self.database = shared_database(self.db)
+        else:
+            self.database = old_database(
+                db_engine,
+                db_host,
+                db_name,
+                db_user,
+                db_pass,
+                db_port,
+                db_pool_size,
+                )
+
         self.db_debug = config.get('database', 'debug', '0') not in NEGATIVE
         self.db.debug = self.db_debug
         self.database.debug = self.db_debug
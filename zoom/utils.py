@@ -9,6 +9,7 @@ import string
 import collections
 import ConfigParser
 import decimal
+import operator
 import datetime
 
 from sys import version_info
@@ -152,6 +153,16 @@ def search(items, text):
         if matches(item, search_terms):
             yield item
 
+def chunks(items, size):
+    """
+    splits a list into lists of at most size items
+
+        >>> list(chunks(range(5), 2))
+        [[0, 1], [2, 3], [4]]
+    """
+    for start in xrange(0, len(items), size):
+        yield items[start:start + size]
+
 def kind(o):
     """
     returns a suitable table name for an object based on the object class
@@ -395,6 +406,101 @@ class DefaultRecord(Record):
             return ''
 
 
+class Row(tuple):
+    """
+    A compact read only record
+
+    Rows keep their values in a tuple and share one map of column names to
+    positions, created by row_type, so large result sets take little more
+    memory than the raw rows while still offering Record style access.
+
+        >>> Person = row_type(['name', 'age'])
+        >>> joe = Person(('Joe', 20))
+        >>> joe.name, joe['age'], joe[0]
+        ('Joe', 20, 'Joe')
+        >>> joe
+        <Row {'name': 'Joe', 'age': 20}>
+        >>> 'age' in joe, joe.get('kids')
+        (True, None)
+        >>> dict(joe)
+        {'age': 20, 'name': 'Joe'}
+        >>> joe.kids
+        Traceback (most recent call last):
+          ...
+        AttributeError: kids
+
+    Columns take precedence over the tuple methods count and index.
+
+        >>> Tally = row_type(['index', 'count'])
+        >>> Tally((1, 20)).count, Tally((1, 20)).index
+        (20, 1)
+    """
+    __slots__ = ()
+    _names = ()
+    _index = {}
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def get(self, name, default=None):
+        index = self._index.get(name)
+        if index is None:
+            return default
+        return tuple.__getitem__(self, index)
+
+    def keys(self):
+        return list(self._names)
+
+    def values(self):
+        return list(self)
+
+    def items(self):
+        return zip(self._names, self)
+
+    def __repr__(self):
+        return '<%s {%s}>' % (
+            self.__class__.__name__,
+            ', '.join('%r: %r' % item for item in self.items()),
+        )
+
+
+def row_type(names, name='Row'):
+    """
+    returns a Row class for rows with the given column names
+
+    Each column gets a property so it is read without going through
+    __getattr__ and is not hidden by the methods Row inherits from tuple.
+
+        >>> Point = row_type(['x', 'y'], 'Point')
+        >>> Point((1, 2)).y
+        2
+    """
+    names = tuple(names)
+    attributes = dict(
+        (n, property(operator.itemgetter(i)))
+        for i, n in enumerate(names)
+        if isinstance(n, basestring) and not n.startswith('_')
+        and n not in Row.__dict__
+    )
+    attributes.update(
+        __slots__=(),
+        _names=names,
+        _index=dict((n, i) for i, n in enumerate(names)),
+    )
+    return type(name, (Row,), attributes)
+
+
 class RecordList(list):
     """a list of Records"""
 